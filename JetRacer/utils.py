@@ -4,13 +4,31 @@ import torch.nn.functional as F
 import cv2
 import PIL.Image
 import numpy as np
+import warnings
+from robot import trace
 
-mean = torch.Tensor([0.485, 0.456, 0.406]).cuda()
-std = torch.Tensor([0.229, 0.224, 0.225]).cuda()
+mean = torch.Tensor([0.485, 0.456, 0.406])
+std = torch.Tensor([0.229, 0.224, 0.225])
+_norm = {}
 
-def preprocess(image):
-    device = torch.device('cuda')
-    image = PIL.Image.fromarray(image)
-    image = transforms.functional.to_tensor(image).to(device)
-    image.sub_(mean[:, None, None]).div_(std[:, None, None])
-    return image[None, ...]
\ No newline at end of file
+@trace.traced('preprocess')
+def preprocess(image, device=torch.device('cuda')):
+    # image is an HxWx3 uint8 array or a robot.framepool.Frame lease; it is read in place, not copied on the host
+    # mean/std are moved to each device once and reused
+    if device not in _norm:
+        _norm[device] = (mean.to(device)[:, None, None], std.to(device)[:, None, None])
+    mean_d, std_d = _norm[device]
+    image = np.asarray(image)
+    if image.flags.writeable:
+        hwc = torch.from_numpy(image)
+    else:
+        # read-only pool views, the tensor is never written
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            hwc = torch.from_numpy(image)
+    # move the uint8 frame first (4x less to transfer), then convert layout and type in one copy
+    hwc = hwc.to(device)
+    chw = torch.empty((3, hwc.shape[0], hwc.shape[1]), dtype=torch.float32, device=device)
+    chw.copy_(hwc.permute(2, 0, 1))
+    chw.div_(255.0).sub_(mean_d).div_(std_d)
+    return chw[None, ...]
\ No newline at end of file
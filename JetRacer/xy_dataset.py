@@ -7,20 +7,28 @@ import torch.utils.data
 import subprocess
 import cv2
 import numpy as np
+from robot import trace
+from robot.dataset import OK, parse_xy_name, scan, update, valid_entries
 
 
 class XYDataset(torch.utils.data.Dataset):
-    def __init__(self, directory, categories, transform=None, random_hflip=False):
+    def __init__(self, directory, categories, transform=None, random_hflip=False, jpeg_cache=None, validate=False):
         super(XYDataset, self).__init__()
         self.directory = directory
         self.categories = categories
         self.transform = transform
+        # optional robot.jpegcache.JpegCache, lets save_entry reuse a frame already encoded for display
+        self.jpeg_cache = jpeg_cache
+        # with validate, refresh runs robot.dataset.scan and keeps only images that decode and are in bounds
+        self.validate = validate
+        self.manifest = None
         self.refresh()
         self.random_hflip = random_hflip
         
     def __len__(self):
         return len(self.annotations)
     
+    @trace.traced('xy_dataset.getitem')
     def __getitem__(self, idx):
         ann = self.annotations[idx]
         image = cv2.imread(ann['image_path'], cv2.IMREAD_COLOR)
@@ -33,33 +41,46 @@ class XYDataset(torch.utils.data.Dataset):
         x = 2.0 * (ann['x'] / width - 0.5) # -1 left, +1 right
         y = 2.0 * (ann['y'] / height - 0.5) # -1 top, +1 bottom
         
-        if self.random_hflip and float(np.random.random(1)) > 0.5:
+        if self.random_hflip and np.random.random() > 0.5:
             image = torch.from_numpy(image.numpy()[..., ::-1].copy())
             x = -x
             
         return image, ann['category_index'], torch.Tensor([x, y])
     
     def _parse(self, path):
-        basename = os.path.basename(path)
-        items = basename.split('_')
-        x = items[0]
-        y = items[1]
-        return int(x), int(y)
+        # x_y_uuid.jpg or the JetBot collector's xy_x_y_uuid.jpg, None for other names
+        parsed = parse_xy_name(path)
+        if parsed is None:
+            return None
+        return parsed[0], parsed[1]
         
+    @trace.traced('xy_dataset.refresh')
     def refresh(self):
         self.annotations = []
+        if self.validate:
+            self.manifest = scan(self.directory)
         for category in self.categories:
-            category_index = self.categories.index(category)
-            for image_path in glob.glob(os.path.join(self.directory, category, '*.jpg')):
-                x, y = self._parse(image_path)
-                self.annotations += [{
-                    'image_path': image_path,
-                    'category_index': category_index,
-                    'category': category,
-                    'x': x,
-                    'y': y
-                }]
+            if self.validate:
+                image_paths = [os.path.join(self.directory, rel) for rel, _ in valid_entries(self.manifest, category)]
+            else:
+                image_paths = glob.glob(os.path.join(self.directory, category, '*.jpg'))
+            for image_path in image_paths:
+                self._annotate(category, image_path)
+
+    def _annotate(self, category, image_path):
+        xy = self._parse(image_path)
+        if xy is None:
+            return
+        x, y = xy
+        self.annotations += [{
+            'image_path': image_path,
+            'category_index': self.categories.index(category),
+            'category': category,
+            'x': x,
+            'y': y
+        }]
         
+    @trace.traced('xy_dataset.save_entry')
     def save_entry(self, category, image, x, y):
         category_dir = os.path.join(self.directory, category)
         if not os.path.exists(category_dir):
@@ -68,8 +89,18 @@ class XYDataset(torch.utils.data.Dataset):
         filename = '%d_%d_%s.jpg' % (x, y, str(uuid.uuid1()))
         
         image_path = os.path.join(category_dir, filename)
-        cv2.imwrite(image_path, image)
-        self.refresh()
+        if self.jpeg_cache is not None:
+            self.jpeg_cache.write(image, image_path)
+        else:
+            cv2.imwrite(image_path, np.asarray(image))
+        if self.validate:
+            # check just the new file instead of walking the whole dataset for every snapshot
+            rel = os.path.join(category, filename)
+            update(self.directory, [rel], self.manifest)
+            if self.manifest['entries'][rel]['status'] == OK:
+                self._annotate(category, image_path)
+        else:
+            self.refresh()
         
     def get_count(self, category):
         i = 0
@@ -0,0 +1,37 @@
+# Run with `python -m benchmarks` from the repository root. No hardware is needed:
+# the PCA9685 is driven through robot.emulator.PCA9685Emulator and images are synthetic.
+import argparse
+import sys
+from . import harness
+from . import bench_robot, bench_dataset, bench_channel, bench_inference
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='robot driver and dataset benchmarks')
+    parser.add_argument('names', nargs='*', help='benchmark names, prefixes or glob patterns (default: all)')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.2, help='seconds spent timing each benchmark')
+    parser.add_argument('--save', metavar='PATH', help='write results as JSON')
+    parser.add_argument('--baseline', metavar='PATH', help='compare against a previously saved JSON result')
+    parser.add_argument('--threshold', type=float, default=0.10, help='allowed slowdown versus baseline (0.10 = 10%%)')
+    parser.add_argument('--list', action='store_true', help='list benchmarks and exit')
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for name, (group, _) in harness.BENCHMARKS.items():
+            print(f"{group:<8} {name}")
+        return 0
+
+    report = harness.run(args.names, args.repeat, args.min_time)
+    if args.save:
+        harness.save(report, args.save)
+    if args.baseline:
+        regressions = harness.compare(report, harness.load(args.baseline), args.threshold)
+        for name, base, cur, ratio in regressions:
+            print(f"REGRESSION {name}: {harness.format_ns(base)} -> {harness.format_ns(cur)} ({ratio:.2f}x)")
+        if regressions:
+            return 1
+        print(f"no regressions above {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
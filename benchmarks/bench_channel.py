@@ -0,0 +1,69 @@
+import atexit
+import multiprocessing
+import os
+import time
+from .harness import benchmark
+from robot.channel import CommandChannel
+
+def _echo(request_name:str, reply_name:str) -> None:
+    # child process: copy every new request back to the reply channel as fast as possible
+    request = CommandChannel.attach(request_name)
+    reply = CommandChannel.attach(reply_name)
+    last = 0
+    while True:
+        cmd = request.read_slot(0)
+        if cmd is None or cmd.seq == last:
+            os.sched_yield()    # let the producer run on single core hosts
+            continue
+        last = cmd.seq
+        if cmd.steering < 0:
+            break
+        reply.write(0, steering=cmd.steering, timestamp=cmd.timestamp)
+
+@benchmark('channel.write', group='ipc')
+def bench_write():
+    channel = CommandChannel.create()
+    atexit.register(channel.unlink)
+    def run():
+        channel.write(0, steering=0.1, throttle=0.2)
+    return run
+
+@benchmark('channel.read.4slots', group='ipc')
+def bench_read():
+    channel = CommandChannel.create(slots=4)
+    atexit.register(channel.unlink)
+    for slot in range(4):
+        channel.write(slot, steering=0.1, throttle=0.2)
+    return channel.read
+
+@benchmark('channel.cross_process_roundtrip', group='ipc')
+def bench_roundtrip():
+    # one producer write -> other process sees it and answers -> producer sees the answer
+    request = CommandChannel.create(slots=1)
+    reply = CommandChannel.create(slots=1)
+    ctx = multiprocessing.get_context('spawn')
+    proc = ctx.Process(target=_echo, args=(request.name, reply.name), daemon=True)
+    proc.start()
+    state = {'value': 0.0}
+    def cleanup():
+        request.write(0, steering=-1.0)
+        proc.join(1.0)
+        request.unlink()
+        reply.unlink()
+    atexit.register(cleanup)
+    def run():
+        state['value'] = (state['value'] + 1.0) % 1000.0
+        request.write(0, steering=state['value'])
+        while True:
+            cmd = reply.read_slot(0)
+            if cmd is not None and cmd.steering == state['value']:
+                break
+            os.sched_yield()
+    # wait for the child to be up before timing
+    request.write(0, steering=1e6)
+    deadline = time.monotonic() + 30.0
+    while time.monotonic() < deadline:
+        cmd = reply.read_slot(0)
+        if cmd is not None and cmd.steering == 1e6:
+            break
+    return run
@@ -0,0 +1,194 @@
+import os
+import sys
+import tempfile
+import uuid
+from .harness import benchmark
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'JetRacer'))
+
+try:
+    import numpy as np
+    import torch
+    import cv2
+except ImportError:
+    np = torch = cv2 = None
+
+DATASET_SIZES = (1000, 10000, 100000)
+CATEGORIES = ['apex', 'turn']
+_datasets = {}
+
+def _dataset_dir(size:int) -> str:
+    # Synthetic dataset of `size` images split over CATEGORIES. refresh/get_count only look at the
+    # file names, so only the first few files hold a real JPEG and the rest are empty placeholders.
+    if size not in _datasets:
+        tmp = tempfile.TemporaryDirectory(prefix=f'xy-bench-{size}-')
+        image = np.random.randint(0, 255, (224, 224, 3), dtype=np.uint8)
+        encoded = cv2.imencode('.jpg', image)[1].tobytes()
+        for i in range(size):
+            category_dir = os.path.join(tmp.name, CATEGORIES[i % len(CATEGORIES)])
+            os.makedirs(category_dir, exist_ok=True)
+            path = os.path.join(category_dir, '%d_%d_%s.jpg' % (i % 224, (i*7) % 224, uuid.uuid1()))
+            with open(path, 'wb') as f:
+                if i < 64:
+                    f.write(encoded)
+        _datasets[size] = tmp
+    return _datasets[size].name
+
+def _register_size(size:int) -> None:
+    @benchmark(f'xy_dataset.refresh.{size}', group='dataset')
+    def bench_refresh():
+        if torch is None:
+            return None
+        from xy_dataset import XYDataset
+        dataset = XYDataset(_dataset_dir(size), CATEGORIES)
+        return dataset.refresh
+
+    @benchmark(f'xy_dataset.get_count.{size}', group='dataset')
+    def bench_get_count():
+        if torch is None:
+            return None
+        from xy_dataset import XYDataset
+        dataset = XYDataset(_dataset_dir(size), CATEGORIES)
+        def run():
+            dataset.get_count(CATEGORIES[1])
+        return run
+
+    @benchmark(f'xy_dataset.getitem.{size}', group='dataset')
+    def bench_getitem():
+        if torch is None:
+            return None
+        import torchvision.transforms as transforms
+        from xy_dataset import XYDataset
+        dataset = XYDataset(_dataset_dir(size), CATEGORIES, transforms.ToTensor(), random_hflip=True)
+        # only indices backed by a real JPEG
+        indices = [i for i, a in enumerate(dataset.annotations) if os.path.getsize(a['image_path']) > 0]
+        state = {'i': 0}
+        def run():
+            state['i'] = (state['i'] + 1) % len(indices)
+            dataset[indices[state['i']]]
+        return run
+
+    @benchmark(f'dataset.rescan.{size}', group='dataset')
+    def bench_rescan():
+        # incremental scan of an unchanged dataset, the first full scan is setup
+        if np is None:
+            return None
+        from robot.dataset import scan
+        directory = _dataset_dir(size)
+        scan(directory)
+        def run():
+            scan(directory)
+        return run
+
+for _size in DATASET_SIZES:
+    _register_size(_size)
+
+@benchmark('dataset.check_image.224', group='dataset')
+def bench_check_image():
+    if np is None:
+        return None
+    from robot.dataset import check_image
+    path = os.path.join(_dataset_dir(DATASET_SIZES[0]), 'check.jpg')
+    cv2.imwrite(path, np.random.randint(0, 255, (224, 224, 3), dtype=np.uint8))
+    def run():
+        check_image(path)
+    return run
+
+@benchmark('heatmap_generator.224', group='dataset')
+def bench_heatmap():
+    if torch is None:
+        return None
+    from xy_dataset import HeatmapGenerator
+    generator = HeatmapGenerator((224, 224), 0.1)
+    xy = torch.Tensor([0.2, -0.3])
+    def run():
+        generator.generate_heatmap(xy)
+    return run
+
+@benchmark('preprocess.cpu.224', group='dataset')
+def bench_preprocess_cpu():
+    if torch is None:
+        return None
+    from utils import preprocess
+    image = np.random.randint(0, 255, (224, 224, 3), dtype=np.uint8)
+    device = torch.device('cpu')
+    def run():
+        preprocess(image, device)
+    return run
+
+@benchmark('framepool.write.224', group='frames')
+def bench_framepool_write():
+    if np is None:
+        return None
+    from robot.framepool import FramePool
+    pool = FramePool((224, 224, 3))
+    image = np.random.randint(0, 255, (224, 224, 3), dtype=np.uint8)
+    def run():
+        pool.write(image)
+    return run
+
+@benchmark('framepool.latest', group='frames')
+def bench_framepool_latest():
+    if np is None:
+        return None
+    from robot.framepool import FramePool
+    pool = FramePool((224, 224, 3))
+    pool.write(np.zeros((224, 224, 3), np.uint8))
+    def run():
+        pool.latest().release()
+    return run
+
+@benchmark('framepool.overlay_copy.224', group='frames')
+def bench_framepool_overlay():
+    if np is None:
+        return None
+    from robot.framepool import FramePool
+    pool = FramePool((224, 224, 3))
+    pool.write(np.zeros((224, 224, 3), np.uint8))
+    def run():
+        with pool.latest() as frame, pool.copy(frame) as overlay:
+            cv2.circle(overlay.array, (100, 100), 8, (0, 255, 0), 3)
+    return run
+
+@benchmark('jpeg_cache.encode.miss.224', group='frames')
+def bench_jpeg_miss():
+    if np is None:
+        return None
+    from robot.jpegcache import JpegCache
+    cache = JpegCache()
+    images = [np.random.randint(0, 255, (224, 224, 3), dtype=np.uint8) for _ in range(4)]
+    state = {'i': 0}
+    def run():
+        # a fresh array object every call, so every call encodes
+        state['i'] = (state['i'] + 1) % len(images)
+        cache.encode(images[state['i']].view())
+    return run
+
+@benchmark('jpeg_cache.encode.hit.224', group='frames')
+def bench_jpeg_hit():
+    if np is None:
+        return None
+    from robot.framepool import FramePool
+    from robot.jpegcache import JpegCache
+    cache = JpegCache()
+    # only published pool frames are cached
+    pool = FramePool((224, 224, 3))
+    pool.write(np.random.randint(0, 255, (224, 224, 3), dtype=np.uint8))
+    frame = pool.latest()
+    def run():
+        cache.encode(frame)
+    return run
+
+@benchmark('jpeg_cache.overlay.224', group='frames')
+def bench_jpeg_overlay():
+    if np is None:
+        return None
+    from robot.framepool import FramePool
+    from robot.jpegcache import JpegCache, Overlay
+    cache = JpegCache()
+    pool = FramePool((224, 224, 3))
+    pool.write(np.random.randint(0, 255, (224, 224, 3), dtype=np.uint8))
+    frame = pool.latest()
+    def run():
+        cache.overlay(frame, Overlay().circle((100, 100), 8, (0, 255, 0), 3))
+    return run
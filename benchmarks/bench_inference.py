@@ -0,0 +1,52 @@
+import os
+import tempfile
+from .harness import benchmark
+
+try:
+    import torch
+except ImportError:
+    torch = None
+
+_weights = None
+
+def _engine(backend:str):
+    # random weights in the layout of best_steering_model_xy.pth, traced into a throwaway cache
+    global _weights
+    from robot.inference import build_model, create_engine
+    if _weights is None:
+        _weights = tempfile.TemporaryDirectory(prefix='inference-bench-')
+        torch.save(build_model(2).state_dict(), os.path.join(_weights.name, 'best_steering_model_xy.pth'))
+    engine = create_engine(os.path.join(_weights.name, 'best_steering_model_xy.pth'), backend,
+                           cache_dir=os.path.join(_weights.name, 'cache'))
+    engine.warmup()
+    return engine
+
+def _register(backend:str) -> None:
+    @benchmark(f'inference.{backend}.batch1', group='inference')
+    def bench_batch1():
+        if torch is None:
+            return None
+        try:
+            engine = _engine(backend)
+        except ImportError:
+            return None
+        data = torch.zeros((1, 3, 224, 224))
+        def run():
+            engine(data)
+        return run
+
+    @benchmark(f'inference.{backend}.batch4', group='inference')
+    def bench_batch4():
+        if torch is None:
+            return None
+        try:
+            engine = _engine(backend)
+        except ImportError:
+            return None
+        data = torch.zeros((4, 3, 224, 224))
+        def run():
+            engine(data)
+        return run
+
+for _backend in ('torchscript', 'onnxruntime'):
+    _register(_backend)
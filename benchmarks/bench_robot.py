@@ -0,0 +1,235 @@
+import os
+import tempfile
+from .harness import benchmark
+from robot.pca9685 import PCA9685
+from robot.emulator import PCA9685Emulator
+# JetBot/JetRacer keep their calibrations in memory here, never in the files under ~
+from robot.config import MemoryConfigStore, JETBOT_SCHEMA, JETRACER_SCHEMA
+
+def _pca(freq:int=1600, raw_i2c:bool=True) -> PCA9685:
+    pca = PCA9685(bus=PCA9685Emulator(raw_i2c=raw_i2c))
+    pca.frequency = freq
+    return pca
+
+@benchmark('pca9685.setitem.int')
+def bench_setitem_int():
+    pca = _pca()
+    def run():
+        pca[0] = 0.5
+    return run
+
+@benchmark('pca9685.setitem.tuple')
+def bench_setitem_tuple():
+    pca = _pca()
+    def run():
+        pca[0, 2] = (0.25, 0.75)
+    return run
+
+@benchmark('pca9685.setitem.slice4')
+def bench_setitem_slice4():
+    pca = _pca()
+    value = [0.0, 0.5, 0.0, 0.5]
+    def run():
+        pca[0:4] = value
+    return run
+
+@benchmark('pca9685.setitem.slice8')
+def bench_setitem_slice8():
+    pca = _pca()
+    def run():
+        pca[0:8] = 0.5
+    return run
+
+@benchmark('pca9685.setitem.slice16.raw')
+def bench_setitem_slice16_raw():
+    pca = _pca()
+    value = [i / 16 for i in range(16)]
+    def run():
+        pca[0:16] = value
+    return run
+
+@benchmark('pca9685.setitem.slice16.chunked')
+def bench_setitem_slice16_chunked():
+    pca = _pca(raw_i2c=False)
+    value = [i / 16 for i in range(16)]
+    def run():
+        pca[0:16] = value
+    return run
+
+@benchmark('pca9685.getitem.slice16')
+def bench_getitem_slice16():
+    pca = _pca()
+    def run():
+        pca[0:16]
+    return run
+
+@benchmark('pca9685.cal_on_off_value')
+def bench_cal_on_off_value():
+    pca = _pca()
+    def run():
+        pca._cal_on_off_value(0.0)
+        pca._cal_on_off_value(0.37)
+        pca._cal_on_off_value(1.0)
+    return run
+
+@benchmark('jetbot.set_motors.contiguous')
+def bench_jetbot_contiguous():
+    from robot.jetbot import JetBot
+    robot = JetBot(bus=PCA9685Emulator(), conf_store=MemoryConfigStore(JETBOT_SCHEMA))
+    def run():
+        robot.set_motors(0.3, -0.6)
+    return run
+
+@benchmark('jetbot.set_motors.non_contiguous')
+def bench_jetbot_non_contiguous():
+    from robot.jetbot import JetBot
+    robot = JetBot(bus=PCA9685Emulator(), left_a=0, left_b=1, right_a=4, right_b=3,
+                   conf_store=MemoryConfigStore(JETBOT_SCHEMA))
+    speeds = [0.3, -0.6]
+    def run():
+        # alternate so the traitlets observers fire every call
+        speeds.reverse()
+        robot.set_motors(speeds[0], speeds[1])
+    return run
+
+@benchmark('jetracer.steering')
+def bench_jetracer_steering():
+    from robot.jetracer import JetRacer
+    car = JetRacer(bus=PCA9685Emulator(), conf_store=MemoryConfigStore(JETRACER_SCHEMA))
+    values = [0.4, -0.4]
+    def run():
+        values.reverse()
+        car.steering = values[0]
+    return run
+
+@benchmark('jetracer.steering_throttle')
+def bench_jetracer_steering_throttle():
+    from robot.jetracer import JetRacer
+    car = JetRacer(bus=PCA9685Emulator(), conf_store=MemoryConfigStore(JETRACER_SCHEMA))
+    values = [0.2, -0.2]
+    def run():
+        values.reverse()
+        car.steering = values[0]
+        car.throttle = values[1]
+    return run
+
+@benchmark('config.load.cached')
+def bench_config_load():
+    from robot.config import ConfigStore
+    home = tempfile.TemporaryDirectory(prefix='robot-bench-')
+    store = ConfigStore(os.path.join(home.name, 'bench_conf.json'), JETBOT_SCHEMA)
+    conf = {'left_motor': {'alpha': 1.0, 'beta': 0.0}, 'right_motor': {'alpha': -1.0, 'beta': 0.0}}
+    store.save(conf, sync=True)
+    def run():
+        store.load()
+    run.home = home    # the directory lives as long as the benchmark
+    return run
+
+@benchmark('watchdog.set_motors_fed')
+def bench_watchdog_feed():
+    from robot.jetbot import JetBot
+    from robot.watchdog import Watchdog
+    robot = JetBot(bus=PCA9685Emulator(), conf_store=MemoryConfigStore(JETBOT_SCHEMA))
+    Watchdog(robot, timeout=60.0).start()
+    def run():
+        robot.set_motors(0.3, -0.6)
+    return run
+
+def _jetbots(n:int) -> list:
+    # four robots per chip on channels 0-3, 4-7, 8-11 and 12-15, a new chip every four robots
+    from robot.jetbot import JetBot
+    store = MemoryConfigStore(JETBOT_SCHEMA)
+    robots = []
+    for i in range(n):
+        if i % 4 == 0:
+            bus = PCA9685Emulator()
+        a = (i % 4) * 4
+        robots.append(JetBot(bus=bus, left_a=a, left_b=a+1, right_a=a+2, right_b=a+3, name=f'bench{i}',
+                             conf_store=store))
+    return robots
+
+@benchmark('fleet.jetbot.loop.32')
+def bench_fleet_loop():
+    robots = _jetbots(32)
+    speeds = [0.3, -0.6]
+    def run():
+        speeds.reverse()
+        for robot in robots:
+            robot.set_motors(speeds[0], speeds[1])
+    return run
+
+@benchmark('fleet.jetbot.set_motors.32')
+def bench_fleet_array():
+    try:
+        import numpy as np
+        from robot.fleet import JetBotArray
+    except ImportError:
+        return None
+    fleet = JetBotArray(_jetbots(32))
+    left = np.linspace(-1.0, 1.0, 32)
+    right = left[::-1].copy()
+    def run():
+        fleet.set_motors(left, right)
+    return run
+
+@benchmark('simulator.jetbot.step.1000')
+def bench_simulator_step():
+    try:
+        from robot.simulator import JetBotSim
+    except ImportError:
+        return None
+    sim = JetBotSim(1000, log_every=0)
+    for robot in sim.robots:
+        robot.set_motors(0.4, 0.6)
+    def run():
+        sim.step()
+    return run
+
+@benchmark('simulator.jetracer.control_step.1000')
+def bench_simulator_control():
+    try:
+        import numpy as np
+        from robot.fleet import JetRacerArray
+        from robot.simulator import JetRacerSim
+    except ImportError:
+        return None
+    sim = JetRacerSim(1000, log_every=0)
+    fleet = JetRacerArray(sim.robots)
+    gains = np.linspace(0.2, 2.0, 1000)
+    def run():
+        fleet.set(-(sim.pose[:, 1] + 0.2 * sim.pose[:, 2]) * gains, 0.2)
+        sim.step()
+    return run
+
+@benchmark('trace.span.disabled')
+def bench_trace_disabled():
+    from robot import trace
+    trace.disable()
+    def run():
+        with trace.span('bench'):
+            pass
+    return run
+
+@benchmark('trace.span.enabled')
+def bench_trace_enabled():
+    from robot import trace
+    def run():
+        trace.enable()
+        with trace.span('bench'):
+            pass
+        trace.disable()
+    return run
+
+@benchmark('jetracer.steering.filtered_jitter')
+def bench_jetracer_filtered():
+    # model-like steering jitter within the deadband, writes are suppressed
+    from robot.jetracer import JetRacer
+    from robot.outputfilter import OutputFilter
+    car = JetRacer(bus=PCA9685Emulator(), conf_store=MemoryConfigStore(JETRACER_SCHEMA))
+    car.servo.output_filter = OutputFilter(deadband=0.01, keepalive=None)
+    values = [0.301, 0.299]
+    car.steering = 0.3
+    def run():
+        values.reverse()
+        car.steering = values[0]
+    return run
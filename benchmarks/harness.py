@@ -0,0 +1,104 @@
+import fnmatch
+import gc
+import json
+import platform
+import statistics
+import sys
+import time
+from typing import Callable, Union
+
+BENCHMARKS = {}
+
+def benchmark(name:str, group:str='robot'):
+    # Register a benchmark. The decorated function does the setup and returns the callable to time,
+    # or None when a dependency is missing on this host.
+    def decorator(factory):
+        BENCHMARKS[name] = (group, factory)
+        return factory
+    return decorator
+
+def measure(func:Callable, repeat:int=5, min_time:float=0.2) -> dict:
+    # grow the loop count (1, 2, 5, 10, 20, ...) until one repeat takes at least min_time / repeat seconds
+    target = min_time / repeat
+    func()  # warm up lazily built state (caches, lookup tables) outside the timing
+    base = 1
+    while True:
+        for number in (base, base*2, base*5):
+            st = time.perf_counter()
+            for _ in range(number):
+                func()
+            if time.perf_counter() - st >= target:
+                break
+        else:
+            base *= 10
+            continue
+        break
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        samples = []
+        for _ in range(repeat):
+            st = time.perf_counter()
+            for _ in range(number):
+                func()
+            samples.append((time.perf_counter() - st) / number * 1e9)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return {
+        'loops': number,
+        'repeat': repeat,
+        'min_ns': min(samples),
+        'median_ns': statistics.median(samples),
+        'mean_ns': statistics.mean(samples),
+        'stdev_ns': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+    }
+
+def run(names:Union[list,None]=None, repeat:int=5, min_time:float=0.2, log=print) -> dict:
+    results = {}
+    for name, (group, factory) in BENCHMARKS.items():
+        if names and not any(fnmatch.fnmatchcase(name, n) or name.startswith(n + '.') or name == n for n in names):
+            continue
+        func = factory()
+        if func is None:
+            log(f"{name:<48} skipped")
+            continue
+        res = measure(func, repeat, min_time)
+        res['group'] = group
+        results[name] = res
+        log(f"{name:<48} {format_ns(res['median_ns']):>12}  (min {format_ns(res['min_ns'])}, {res['loops']} loops)")
+    return {
+        'meta': {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+        },
+        'results': results,
+    }
+
+def format_ns(ns:float) -> str:
+    for unit, scale in (('s', 1e9), ('ms', 1e6), ('us', 1e3)):
+        if ns >= scale:
+            return f"{ns/scale:.2f} {unit}"
+    return f"{ns:.1f} ns"
+
+def save(report:dict, path:str) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=4)
+
+def load(path:str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+def compare(report:dict, baseline:dict, threshold:float=0.10) -> list:
+    # Return (name, baseline_ns, current_ns, ratio) for every benchmark slower than baseline by more than threshold
+    regressions = []
+    for name, res in report['results'].items():
+        base = baseline['results'].get(name)
+        if base is None:
+            continue
+        ratio = res['median_ns'] / base['median_ns']
+        if ratio > 1.0 + threshold:
+            regressions.append((name, base['median_ns'], res['median_ns'], ratio))
+    return regressions
@@ -0,0 +1,178 @@
+from typing import Union, Callable
+import bisect
+import collections
+import threading
+try:
+    import numpy as np
+except ImportError:
+    # tables are then built entry by entry
+    np = None
+
+class CalibrationCurve:
+    # Map from a normalized command in [-1.0, 1.0] to an actuator output.
+    # points: (command, output) pairs, output in duty cycle (unit='duty') or pulse width in microsecond (unit='us')
+    # kind: 'linear' for piecewise linear, 'spline' for a monotone cubic (PCHIP) through the points
+    # deadband: commands with |x| <= deadband give the output at 0, the rest of the range is stretched to keep +-1 reachable
+    def __init__(self, points:list, kind:str='linear', deadband:float=0.0, unit:str='duty') -> None:
+        points = sorted((float(x), float(y)) for x, y in points)
+        if len(points) < 2:
+            raise ValueError("calibration curve needs at least 2 points")
+        for (x0, _), (x1, _) in zip(points, points[1:]):
+            if x0 == x1:
+                raise ValueError(f"calibration curve has duplicated command {x0}")
+        if kind not in ('linear', 'spline'):
+            raise ValueError(f"calibration curve kind {kind} not supported, should be 'linear' or 'spline'")
+        if unit not in ('duty', 'us'):
+            raise ValueError(f"calibration curve unit {unit} not supported, should be 'duty' or 'us'")
+        if not (0.0 <= deadband < 1.0):
+            raise ValueError(f"deadband {deadband} out of range, should be within 0.0 to 1.0")
+        self.xs = [p[0] for p in points]
+        self.ys = [p[1] for p in points]
+        self.kind = kind
+        self.deadband = deadband
+        self.unit = unit
+        self._slopes = self._pchip_slopes() if kind == 'spline' else None
+
+    @property
+    def key(self) -> tuple:
+        # hashable description, equal for curves that give the same outputs
+        return (tuple(self.xs), tuple(self.ys), self.kind, self.deadband, self.unit)
+
+    @classmethod
+    def linear(cls, alpha0:float, alpha1:float, beta:float, deadband:float=0.0) -> 'CalibrationCurve':
+        # the original alpha/beta map: alpha0 above center, alpha1 below
+        return cls([(-1.0, beta-alpha1), (0.0, beta), (1.0, beta+alpha0)], deadband=deadband)
+
+    def __call__(self, x:Union[float,int]) -> float:
+        if self.deadband > 0:
+            if abs(x) <= self.deadband:
+                x = 0.0
+            else:
+                x = (abs(x) - self.deadband) / (1.0 - self.deadband) * (1 if x > 0 else -1)
+        xs, ys = self.xs, self.ys
+        if x <= xs[0]:
+            return ys[0]
+        if x >= xs[-1]:
+            return ys[-1]
+        i = bisect.bisect_right(xs, x) - 1
+        h = xs[i+1] - xs[i]
+        t = (x - xs[i]) / h
+        if self._slopes is None:
+            return ys[i] + t * (ys[i+1] - ys[i])
+        # cubic Hermite segment
+        t2 = t * t
+        t3 = t2 * t
+        return ((2*t3 - 3*t2 + 1) * ys[i] + (t3 - 2*t2 + t) * h * self._slopes[i]
+                + (-2*t3 + 3*t2) * ys[i+1] + (t3 - t2) * h * self._slopes[i+1])
+
+    def evaluate(self, x:'np.ndarray') -> 'np.ndarray':
+        # __call__ over an array of commands, with the same arithmetic so the results are identical
+        x = np.asarray(x, dtype=np.float64)
+        if self.deadband > 0:
+            ax = np.abs(x)
+            x = np.where(ax <= self.deadband, 0.0, (ax - self.deadband) / (1.0 - self.deadband) * np.where(x > 0, 1, -1))
+        xs, ys = np.array(self.xs), np.array(self.ys)
+        i = np.clip(np.searchsorted(xs, x, side='right') - 1, 0, len(xs) - 2)
+        h = xs[i+1] - xs[i]
+        t = (x - xs[i]) / h
+        if self._slopes is None:
+            y = ys[i] + t * (ys[i+1] - ys[i])
+        else:
+            m = np.array(self._slopes)
+            t2 = t * t
+            t3 = t2 * t
+            y = ((2*t3 - 3*t2 + 1) * ys[i] + (t3 - 2*t2 + t) * h * m[i]
+                 + (-2*t3 + 3*t2) * ys[i+1] + (t3 - t2) * h * m[i+1])
+        return np.where(x <= xs[0], ys[0], np.where(x >= xs[-1], ys[-1], y))
+
+    def to_duty(self, value:float, frequency:Union[float,int]) -> float:
+        if self.unit == 'us':
+            return value * frequency / 1000000
+        return value
+
+    def _pchip_slopes(self) -> list:
+        # Fritsch-Carlson slopes, keeps the curve monotone wherever the points are
+        xs, ys = self.xs, self.ys
+        n = len(xs)
+        h = [xs[i+1] - xs[i] for i in range(n-1)]
+        d = [(ys[i+1] - ys[i]) / h[i] for i in range(n-1)]
+        if n == 2:
+            return [d[0], d[0]]
+        m = [0.0] * n
+        for i in range(1, n-1):
+            if d[i-1] * d[i] > 0:
+                w1 = 2*h[i] + h[i-1]
+                w2 = h[i] + 2*h[i-1]
+                m[i] = (w1 + w2) / (w1/d[i-1] + w2/d[i])
+        m[0] = self._pchip_end_slope(h[0], h[1], d[0], d[1])
+        m[-1] = self._pchip_end_slope(h[-1], h[-2], d[-1], d[-2])
+        return m
+
+    @staticmethod
+    def _pchip_end_slope(h0, h1, d0, d1) -> float:
+        m = ((2*h0 + h1)*d0 - h0*d1) / (h0 + h1)
+        if m * d0 <= 0:
+            return 0.0
+        if d0 * d1 <= 0 and abs(m) > abs(3*d0):
+            return 3*d0
+        return m
+
+class LookupTable:
+    # Dense table from a normalized command in [-1.0, 1.0] to a precomputed entry (a 12-bit PWM count,
+    # or a pair of counts for motors). The default resolution gives 4096 steps per half range so an
+    # identity map loses nothing to the 12-bit quantization.
+    # func gives the entry of one command; without it, entries is the list of all of them for the commands
+    # of grid(resolution), e.g. computed in one NumPy pass
+    def __init__(self, func:Union[Callable,None], resolution:int=8193, entries:Union[list,None]=None) -> None:
+        if resolution < 3 or resolution % 2 == 0:
+            raise ValueError(f"lookup table resolution {resolution} should be an odd number >= 3")
+        self.resolution = resolution
+        self.scale = (resolution - 1) / 2.0
+        if entries is None:
+            entries = [func(i / self.scale - 1.0) for i in range(resolution)]
+        elif len(entries) != resolution:
+            raise ValueError(f"lookup table needs {resolution} entries, got {len(entries)}")
+        self.entries = entries
+        self._last = resolution - 1
+
+    @staticmethod
+    def grid(resolution:int) -> 'np.ndarray':
+        # the commands of the table entries, the same values the entry by entry build uses
+        return np.arange(resolution) / ((resolution - 1) / 2.0) - 1.0
+
+    def index(self, x:Union[float,int]) -> int:
+        if x >= 1.0:
+            return self._last
+        if x <= -1.0:
+            return 0
+        return int((x + 1.0) * self.scale + 0.5)
+
+    def __call__(self, x:Union[float,int]):
+        return self.entries[self.index(x)]
+
+def duty_to_count(duty_cycle:float) -> int:
+    # same quantization as PCA9685._cal_on_off_value
+    return min(max(int(duty_cycle*4096), 0), 4096)
+
+def duty_to_counts(duty_cycles:'np.ndarray') -> 'np.ndarray':
+    # duty_to_count over an array
+    return np.clip(np.trunc(duty_cycles * 4096), 0, 4096).astype(np.int64)
+
+# Tables shared by every actuator with the same calibration, keyed by the calibration parameters
+TABLE_CACHE_SIZE = 256
+_tables = collections.OrderedDict()
+_tables_lock = threading.Lock()
+
+def cached_table(key:tuple, build:Callable) -> LookupTable:
+    # the table for key, built with build() the first time; tables are never modified once built
+    with _tables_lock:
+        table = _tables.get(key)
+        if table is not None:
+            _tables.move_to_end(key)
+            return table
+    table = build()
+    with _tables_lock:
+        table = _tables.setdefault(key, table)
+        while len(_tables) > TABLE_CACHE_SIZE:
+            _tables.popitem(last=False)
+    return table
@@ -0,0 +1,213 @@
+import collections
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+import uuid
+from typing import Union
+
+NAN = float('nan')
+SHM_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+
+Command = collections.namedtuple('Command', ['seq', 'timestamp', 'steering', 'throttle', 'left', 'right', 'slot'])
+
+class CommandChannel:
+    # Latest-value command slots in a shared memory mapping, for handing commands from inference processes to an
+    # actuation process without pickling or locks.
+    #
+    # Each producer owns one slot and updates it seqlock style: the sequence number is made odd, the
+    # payload written, then the sequence made even again. A reader retries while the sequence is odd or
+    # changed under it, and read() returns the newest complete command over all slots. Unset fields are NaN.
+    # Python gives no memory barrier here; the struct calls are far apart enough in practice, and a torn
+    # read is caught by the sequence check.
+    MAGIC = 0x524F4243   # 'ROBC'
+    VERSION = 1
+    HEADER = struct.Struct('<IIII')            # magic, version, slots, slot size
+    SEQ = struct.Struct('<Q')
+    PAYLOAD = struct.Struct('<dddddd')         # timestamp, steering, throttle, left, right, reserved
+    SLOT_SIZE = 64                             # one cache line per slot
+
+    def __init__(self, name:Union[str,None]=None, slots:int=4, create:bool=False) -> None:
+        # name is a file name in /dev/shm (or the temp directory where there is no /dev/shm)
+        if name is None:
+            name = 'robot-cmd-' + uuid.uuid4().hex[:12]
+        self.name = name
+        self.path = os.path.join(SHM_DIR, name)
+        if create:
+            size = self.HEADER.size + self.SLOT_SIZE * slots
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o600)
+            try:
+                os.ftruncate(fd, size)
+                self._mmap = mmap.mmap(fd, size)
+            finally:
+                os.close(fd)
+            self.HEADER.pack_into(self._mmap, 0, self.MAGIC, self.VERSION, slots, self.SLOT_SIZE)
+        else:
+            fd = os.open(self.path, os.O_RDWR)
+            try:
+                self._mmap = mmap.mmap(fd, 0)
+            finally:
+                os.close(fd)
+            magic, version, slots, slot_size = self.HEADER.unpack_from(self._mmap, 0)
+            if magic != self.MAGIC or version != self.VERSION or slot_size != self.SLOT_SIZE:
+                self._mmap.close()
+                raise ValueError(f"{self.path} is not a version {self.VERSION} command channel")
+        self.owner = create
+        self.slots = slots
+        self.buf = self._mmap
+        self._offsets = [self.HEADER.size + i * self.SLOT_SIZE for i in range(slots)]
+
+    @classmethod
+    def create(cls, name:Union[str,None]=None, slots:int=4) -> 'CommandChannel':
+        return cls(name, slots, create=True)
+
+    @classmethod
+    def attach(cls, name:str) -> 'CommandChannel':
+        return cls(name)
+
+    def write(self, slot:int=0, steering:float=NAN, throttle:float=NAN, left:float=NAN, right:float=NAN,
+              timestamp:Union[float,None]=None) -> int:
+        # timestamp defaults to now (time.monotonic, comparable across processes); returns the new sequence number
+        offset = self._offsets[slot]
+        buf = self.buf
+        seq = self.SEQ.unpack_from(buf, offset)[0] | 1
+        self.SEQ.pack_into(buf, offset, seq)
+        self.PAYLOAD.pack_into(buf, offset + 8, time.monotonic() if timestamp is None else timestamp,
+                               steering, throttle, left, right, 0.0)
+        self.SEQ.pack_into(buf, offset, seq + 1)
+        return seq + 1
+
+    def read_slot(self, slot:int, retries:int=100) -> Union[Command,None]:
+        offset = self._offsets[slot]
+        buf = self.buf
+        for _ in range(retries):
+            seq = self.SEQ.unpack_from(buf, offset)[0]
+            if seq & 1:
+                continue
+            payload = self.PAYLOAD.unpack_from(buf, offset + 8)
+            if self.SEQ.unpack_from(buf, offset)[0] == seq:
+                if seq == 0:
+                    return None
+                return Command(seq, payload[0], payload[1], payload[2], payload[3], payload[4], slot)
+        return None
+
+    def read(self) -> Union[Command,None]:
+        # newest command over all slots, None if nothing was written yet
+        latest = None
+        for slot in range(self.slots):
+            cmd = self.read_slot(slot)
+            if cmd is not None and (latest is None or cmd.timestamp > latest.timestamp):
+                latest = cmd
+        return latest
+
+    def close(self) -> None:
+        self.buf = None
+        self._mmap.close()
+
+    def unlink(self) -> None:
+        os.unlink(self.path)
+
+    def __enter__(self) -> 'CommandChannel':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+        if self.owner:
+            self.unlink()
+
+class ActuationDaemon:
+    # Applies the newest command from a CommandChannel to a JetBot (left/right) or JetRacer
+    # (steering/throttle) at a fixed rate. Commands older than max_age stop the robot once.
+    def __init__(self, robot, channel:CommandChannel, rate:float=100.0, max_age:float=0.5, history:int=1000) -> None:
+        self.robot = robot
+        self.channel = channel
+        self.period = 1.0 / rate
+        self.max_age = max_age
+        self.latencies = collections.deque(maxlen=history)
+        self.applied = 0
+        self.overruns = 0
+        self._last = (None, None)
+        self._stopped = False
+        self._running = False
+        self._wake = threading.Event()
+        self._thread = None
+
+    def step(self) -> bool:
+        # apply the newest command if it is new; returns True when a command was written
+        cmd = self.channel.read()
+        now = time.monotonic()
+        if cmd is None:
+            return False
+        if now - cmd.timestamp > self.max_age:
+            if not self._stopped:
+                self.robot.stop()
+                self._stopped = True
+            return False
+        if (cmd.slot, cmd.seq) == self._last:
+            return False
+        self._last = (cmd.slot, cmd.seq)
+        # robot.stop() goes through set_motors or the steering/throttle traits, so a command repeating the one
+        # from before a stale stop is written again
+        if hasattr(self.robot, 'set_motors'):
+            if math.isnan(cmd.left) or math.isnan(cmd.right):
+                return False
+            self.robot.set_motors(cmd.left, cmd.right)
+        else:
+            if math.isnan(cmd.steering) and math.isnan(cmd.throttle):
+                return False
+            with self.robot.pca.batch():
+                if not math.isnan(cmd.steering):
+                    self.robot.steering = cmd.steering
+                if not math.isnan(cmd.throttle):
+                    self.robot.throttle = cmd.throttle
+        self._stopped = False
+        self.applied += 1
+        self.latencies.append(time.monotonic() - cmd.timestamp)
+        return True
+
+    def run(self) -> None:
+        self._running = True
+        self._loop()
+
+    def _loop(self) -> None:
+        next_tick = time.monotonic()
+        while self._running:
+            self.step()
+            next_tick += self.period
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                self._wake.wait(delay)
+            else:
+                # fell behind, skip the missed ticks instead of bursting
+                self.overruns += 1
+                next_tick = time.monotonic()
+
+    def start(self) -> 'ActuationDaemon':
+        self._wake.clear()
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, name='robot-actuation', daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self) -> None:
+        self._running = False
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self) -> dict:
+        # command timestamp to register write, in seconds
+        values = sorted(self.latencies)
+        res = {'applied': self.applied, 'overruns': self.overruns}
+        if values:
+            res['latency'] = {
+                'min': values[0],
+                'median': values[len(values) // 2],
+                'p99': values[min(len(values) - 1, int(len(values) * 0.99))],
+                'max': values[-1],
+            }
+        return res
@@ -0,0 +1,235 @@
+import atexit
+import copy
+import json
+import math
+import os
+import tempfile
+import threading
+from typing import Union
+
+# Calibration file layout (version 2):
+# {
+#     "version": 2,
+#     "robots": {
+#         "<robot name>": {
+#             "profile": "<active profile>",
+#             "profiles": {"<profile name>": {<section>: {<key>: <number>}}}
+#         }
+#     }
+# }
+# A version 1 file (a bare profile, as written by older releases) is read as robot "default", profile "default".
+CONF_VERSION = 2
+DEFAULT_ROBOT = 'default'
+DEFAULT_PROFILE = 'default'
+
+# schema: section -> key -> (min, max) bounds, None for an unbounded finite number
+JETBOT_SCHEMA = {
+    'left_motor': {'alpha': None, 'beta': None},
+    'right_motor': {'alpha': None, 'beta': None},
+}
+JETRACER_SCHEMA = {
+    'servo': {'alpha0': None, 'alpha1': None, 'beta': (0.0, 1.0), 'min_duty': (0.0, 1.0), 'max_duty': (0.0, 1.0)},
+    'motor': {'alpha0': None, 'alpha1': None, 'beta': (0.0, 1.0), 'min_duty': (0.0, 1.0), 'max_duty': (0.0, 1.0)},
+}
+
+class ConfigError(ValueError):
+    pass
+
+def validate_profile(conf, schema:dict, where:str='profile') -> None:
+    if not isinstance(conf, dict):
+        raise ConfigError(f"{where} should be an object, got {type(conf).__name__}")
+    for section, keys in schema.items():
+        if not isinstance(conf.get(section), dict):
+            raise ConfigError(f"{where} is missing section '{section}'")
+        for key, bounds in keys.items():
+            value = conf[section].get(key)
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+                raise ConfigError(f"{where}.{section}.{key} should be a finite number, got {value!r}")
+            if bounds is not None and not (bounds[0] <= value <= bounds[1]):
+                raise ConfigError(f"{where}.{section}.{key} = {value} out of range {bounds[0]} to {bounds[1]}")
+        if 'min_duty' in keys and 'max_duty' in keys and conf[section]['min_duty'] > conf[section]['max_duty']:
+            raise ConfigError(f"{where}.{section}.min_duty is greater than max_duty")
+
+def validate_document(doc, schema:dict) -> None:
+    if not isinstance(doc, dict) or doc.get('version') != CONF_VERSION or not isinstance(doc.get('robots'), dict):
+        raise ConfigError(f"not a version {CONF_VERSION} calibration document")
+    for robot, entry in doc['robots'].items():
+        if not isinstance(entry, dict) or not isinstance(entry.get('profiles'), dict):
+            raise ConfigError(f"robot '{robot}' has no profiles")
+        if entry.get('profile') not in entry['profiles']:
+            raise ConfigError(f"robot '{robot}' selects unknown profile {entry.get('profile')!r}")
+        for profile, conf in entry['profiles'].items():
+            validate_profile(conf, schema, f"{robot}/{profile}")
+
+class ConfigStore:
+    # One store per file, shared by every robot object using that file. Parsed documents are cached
+    # by file mtime/size, and saves are coalesced for `debounce` seconds into one atomic rewrite.
+    _stores = {}
+    _stores_lock = threading.Lock()
+
+    def __init__(self, path:str, schema:dict, debounce:float=0.5) -> None:
+        self.path = os.path.abspath(path)
+        self.schema = schema
+        self.debounce = debounce
+        self._lock = threading.RLock()
+        self._doc = None
+        self._stat_key = None
+        self._pending = {}
+        self._timer = None
+        self.writes = 0
+
+    @classmethod
+    def open(cls, path:str, schema:dict, debounce:float=0.5) -> 'ConfigStore':
+        path = os.path.abspath(path)
+        with cls._stores_lock:
+            store = cls._stores.get(path)
+            if store is None:
+                store = cls._stores[path] = cls(path, schema, debounce)
+            return store
+
+    @classmethod
+    def flush_all(cls) -> None:
+        with cls._stores_lock:
+            stores = list(cls._stores.values())
+        for store in stores:
+            store.flush()
+
+    def exists(self) -> bool:
+        with self._lock:
+            return bool(self._pending) or os.path.isfile(self.path)
+
+    def robots(self) -> list:
+        with self._lock:
+            names = set(self._document()['robots']) | {r for r, _ in self._pending}
+            return sorted(names)
+
+    def profiles(self, robot:str=DEFAULT_ROBOT) -> list:
+        with self._lock:
+            entry = self._document()['robots'].get(robot, {'profiles': {}})
+            names = set(entry['profiles']) | {p for r, p in self._pending if r == robot}
+            return sorted(names)
+
+    def active_profile(self, robot:str=DEFAULT_ROBOT) -> str:
+        with self._lock:
+            entry = self._document()['robots'].get(robot)
+            return entry['profile'] if entry else DEFAULT_PROFILE
+
+    def load(self, robot:str=DEFAULT_ROBOT, profile:Union[str,None]=None) -> Union[dict,None]:
+        # Return a copy of the profile, or None if the robot/profile has never been saved
+        with self._lock:
+            profile = profile or self.active_profile(robot)
+            if (robot, profile) in self._pending:
+                return copy.deepcopy(self._pending[(robot, profile)])
+            entry = self._document()['robots'].get(robot)
+            if entry is None or profile not in entry['profiles']:
+                return None
+            return copy.deepcopy(entry['profiles'][profile])
+
+    def save(self, conf:dict, robot:str=DEFAULT_ROBOT, profile:Union[str,None]=None, sync:bool=False) -> None:
+        validate_profile(conf, self.schema, f"{robot}/{profile or 'active'}")
+        with self._lock:
+            profile = profile or self.active_profile(robot)
+            self._pending[(robot, profile)] = copy.deepcopy(conf)
+            if sync or self.debounce <= 0:
+                self.flush()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.debounce, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def set_active_profile(self, robot:str, profile:str) -> None:
+        with self._lock:
+            self.flush()
+            doc = copy.deepcopy(self._document())
+            entry = doc['robots'].get(robot)
+            if entry is None or profile not in entry['profiles']:
+                raise ConfigError(f"robot '{robot}' has no profile '{profile}'")
+            entry['profile'] = profile
+            self._write(doc)
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._pending:
+                return
+            # merge into the current file content so entries written by other processes survive
+            doc = copy.deepcopy(self._document())
+            for (robot, profile), conf in self._pending.items():
+                entry = doc['robots'].setdefault(robot, {'profile': profile, 'profiles': {}})
+                entry['profiles'][profile] = conf
+            self._write(doc)
+            self._pending = {}
+
+    def _document(self) -> dict:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            self._doc, self._stat_key = {'version': CONF_VERSION, 'robots': {}}, None
+            return self._doc
+        stat_key = (st.st_mtime_ns, st.st_size, st.st_ino)
+        if stat_key != self._stat_key or self._doc is None:
+            self._doc = self._read()
+            self._stat_key = stat_key
+        return self._doc
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path) as f:
+                doc = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ConfigError(f"{self.path} is not valid JSON: {e}") from e
+        if isinstance(doc, dict) and 'robots' not in doc:
+            # version 1: the file is a single profile
+            validate_profile(doc, self.schema, self.path)
+            doc = {'version': CONF_VERSION, 'robots': {DEFAULT_ROBOT: {'profile': DEFAULT_PROFILE, 'profiles': {DEFAULT_PROFILE: doc}}}}
+        validate_document(doc, self.schema)
+        return doc
+
+    def _write(self, doc:dict) -> None:
+        directory = os.path.dirname(self.path)
+        fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(self.path) + '.', suffix='.tmp', dir=directory)
+        try:
+            try:
+                mode = os.stat(self.path).st_mode & 0o777
+            except FileNotFoundError:
+                umask = os.umask(0)
+                os.umask(umask)
+                mode = 0o666 & ~umask
+            os.chmod(tmp_path, mode)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(doc, f, ensure_ascii=False, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        st = os.stat(self.path)
+        self._doc = doc
+        self._stat_key = (st.st_mtime_ns, st.st_size, st.st_ino)
+        self.writes += 1
+
+class MemoryConfigStore(ConfigStore):
+    # ConfigStore that keeps its document in memory and never touches the disk, e.g. for simulated robots
+    def __init__(self, schema:dict, doc:Union[dict,None]=None) -> None:
+        super().__init__(':memory:', schema, debounce=0.0)
+        self.path = ':memory:'
+        if doc is not None:
+            validate_document(doc, schema)
+        self._doc = copy.deepcopy(doc) if doc is not None else {'version': CONF_VERSION, 'robots': {}}
+
+    def exists(self) -> bool:
+        with self._lock:
+            return bool(self._pending) or bool(self._doc['robots'])
+
+    def _document(self) -> dict:
+        return self._doc
+
+    def _write(self, doc:dict) -> None:
+        self._doc = doc
+        self.writes += 1
+
+atexit.register(ConfigStore.flush_all)
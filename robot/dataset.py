@@ -0,0 +1,242 @@
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+from typing import Union
+import cv2
+import numpy as np
+
+# Integrity scanner for the xy datasets written by the data collection notebooks:
+#   JetRacer  <root>/<category>/<x>_<y>_<uuid>.jpg
+#   JetBot    <root>/xy_<x>_<y>_<uuid>.jpg    (x, y zero padded to 3 digits)
+# Every image is decoded in a process pool and checked, the results go into <root>/manifest.json.
+# Files whose size and mtime match the manifest are not read again, so re-scans only touch changes.
+#
+#   python -m robot.dataset dataset_xy             # scan and print a report
+#   python -m robot.dataset dataset_xy --repair    # also move bad files and duplicates to .quarantine
+
+MANIFEST = 'manifest.json'
+QUARANTINE = '.quarantine'
+MANIFEST_VERSION = 1
+
+_NAME = re.compile(r'^(?:xy_)?(-?\d+)_(-?\d+)_(.+)\.jpe?g$', re.IGNORECASE)
+
+# statuses; everything but 'ok' is left out of training
+OK = 'ok'
+UNPARSED = 'unparsed'
+CORRUPT = 'corrupt'
+TRUNCATED = 'truncated'
+OUT_OF_BOUNDS = 'out_of_bounds'
+DUPLICATE = 'duplicate'
+
+def parse_xy_name(path:str) -> Union[tuple,None]:
+    # (x, y, uuid) from either naming scheme, None when the name doesn't match
+    m = _NAME.match(os.path.basename(path))
+    if m is None:
+        return None
+    return int(m.group(1)), int(m.group(2)), m.group(3)
+
+def check_image(path:str) -> dict:
+    # decode and validate one image; hash is of the file content so copies under other names match
+    res = {'status': OK}
+    parsed = parse_xy_name(path)
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError as e:
+        res.update(status=CORRUPT, error=str(e))
+        return res
+    res['hash'] = hashlib.blake2b(data, digest_size=16).hexdigest()
+    if parsed is None:
+        res.update(status=UNPARSED, error='file name is not <x>_<y>_<uuid>.jpg or xy_<x>_<y>_<uuid>.jpg')
+    else:
+        res['x'], res['y'], res['uuid'] = parsed
+    if not data.startswith(b'\xff\xd8'):
+        res.update(status=CORRUPT, error='no JPEG start of image marker')
+        return res
+    # libjpeg pads a cut off file with gray and only warns, so a missing end of image marker is the tell
+    if not data.rstrip(b'\x00').endswith(b'\xff\xd9'):
+        res.update(status=TRUNCATED, error='no JPEG end of image marker')
+        return res
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        res.update(status=CORRUPT, error='JPEG decoding failed')
+        return res
+    res['height'], res['width'] = image.shape[:2]
+    if parsed is not None and not (0 <= res['x'] < res['width'] and 0 <= res['y'] < res['height']):
+        res.update(status=OUT_OF_BOUNDS, error=f"({res['x']}, {res['y']}) outside the {res['width']}x{res['height']} image")
+    return res
+
+def _check_batch(paths:list) -> list:
+    return [check_image(p) for p in paths]
+
+def _walk(root:str) -> dict:
+    # {relative path: (size, mtime_ns)} of every .jpg under root, skipping the quarantine; a root that doesn't
+    # exist yet (before the first snapshot) is empty
+    files = {}
+    if not os.path.isdir(root):
+        return files
+    stack = ['']
+    while stack:
+        rel_dir = stack.pop()
+        with os.scandir(os.path.join(root, rel_dir)) as it:
+            for entry in it:
+                rel = os.path.join(rel_dir, entry.name)
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name != QUARANTINE:
+                        stack.append(rel)
+                elif entry.name.lower().endswith(('.jpg', '.jpeg')):
+                    st = entry.stat()
+                    files[rel] = (st.st_size, st.st_mtime_ns)
+    return files
+
+def load_manifest(root:str) -> dict:
+    try:
+        with open(os.path.join(root, MANIFEST), 'r') as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {'version': MANIFEST_VERSION, 'entries': {}}
+    if manifest.get('version') != MANIFEST_VERSION:
+        return {'version': MANIFEST_VERSION, 'entries': {}}
+    return manifest
+
+def save_manifest(root:str, manifest:dict) -> None:
+    # atomic like ConfigStore.flush, a reader never sees half a manifest
+    fd, tmp_path = tempfile.mkstemp(prefix='.manifest.', suffix='.tmp', dir=root)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            # dumps runs the C encoder, dump to a file object doesn't
+            f.write(json.dumps(manifest))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(root, MANIFEST))
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def scan(root:str, workers:Union[int,None]=None, batch:int=256, save:bool=True) -> dict:
+    # Scan root and return the manifest {'version', 'scanned', 'entries': {relative path: entry}}.
+    # Only new and changed files are decoded, in a pool of `workers` processes (default: all cores).
+    st = time.perf_counter()
+    manifest = load_manifest(root)
+    old = manifest['entries']
+    files = _walk(root)
+    entries = {}
+    todo = []
+    for rel, (size, mtime_ns) in files.items():
+        entry = old.get(rel)
+        if entry is not None and entry['size'] == size and entry['mtime_ns'] == mtime_ns:
+            entries[rel] = entry
+        else:
+            todo.append(rel)
+    todo.sort()
+    paths = [os.path.join(root, rel) for rel in todo]
+    batches = [paths[i:i + batch] for i in range(0, len(paths), batch)]
+    if len(batches) > 1 and (workers is None or workers > 1):
+        with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+            results = [r for rs in pool.map(_check_batch, batches) for r in rs]
+    else:
+        results = _check_batch(paths)
+    for rel, res in zip(todo, results):
+        res['size'], res['mtime_ns'] = files[rel]
+        res['category'] = os.path.dirname(rel)
+        entries[rel] = res
+    _mark_duplicates(entries)
+    manifest = {'version': MANIFEST_VERSION, 'entries': entries}
+    manifest['scanned'] = len(todo)
+    manifest['scan_time'] = time.perf_counter() - st
+    if save and (todo or len(entries) != len(old)):
+        save_manifest(root, manifest)
+    return manifest
+
+def update(root:str, rel_paths:list, manifest:Union[dict,None]=None, save:bool=False) -> dict:
+    # Check just the given files (relative to root) and put their entries into the manifest in place, e.g.
+    # after a snapshot. Without save the manifest on disk is left as it is, the next scan() picks the files up.
+    if manifest is None:
+        manifest = load_manifest(root)
+    entries = manifest['entries']
+    for rel in rel_paths:
+        path = os.path.join(root, rel)
+        res = check_image(path)
+        st = os.stat(path)
+        res['size'], res['mtime_ns'] = st.st_size, st.st_mtime_ns
+        res['category'] = os.path.dirname(rel)
+        entries[rel] = res
+    # no decoding, cheap next to the check_image calls
+    _mark_duplicates(entries)
+    if save:
+        save_manifest(root, manifest)
+    return manifest
+
+def _mark_duplicates(entries:dict) -> None:
+    # among valid images the first path in sorted order is kept, later copies of the same bytes are
+    # duplicates; files with their own problem keep that status
+    first = {}
+    for rel in sorted(entries):
+        entry = entries[rel]
+        if entry['status'] == DUPLICATE:
+            entry['status'] = OK
+            del entry['duplicate_of']
+        if entry['status'] != OK:
+            continue
+        if entry['hash'] in first:
+            entry['status'] = DUPLICATE
+            entry['duplicate_of'] = first[entry['hash']]
+        else:
+            first[entry['hash']] = rel
+
+def valid_entries(manifest:dict, category:Union[str,None]=None) -> list:
+    # (relative path, entry) of every image fit for training, optionally of one category
+    return [(rel, e) for rel, e in sorted(manifest['entries'].items())
+            if e['status'] == OK and (category is None or e['category'] == category)]
+
+def report(manifest:dict) -> dict:
+    counts = {}
+    for e in manifest['entries'].values():
+        counts[e['status']] = counts.get(e['status'], 0) + 1
+    return counts
+
+def repair(root:str, manifest:dict) -> list:
+    # move every file that is not ok into root/.quarantine/<status>/, keeping its relative path;
+    # returns the moved relative paths and rewrites the manifest without them
+    moved = []
+    for rel, e in sorted(manifest['entries'].items()):
+        if e['status'] == OK:
+            continue
+        dst = os.path.join(root, QUARANTINE, e['status'], rel)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        shutil.move(os.path.join(root, rel), dst)
+        moved.append(rel)
+    for rel in moved:
+        del manifest['entries'][rel]
+    save_manifest(root, manifest)
+    return moved
+
+def main(argv:Union[list,None]=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m robot.dataset', description='Validate an xy dataset and write its manifest.')
+    parser.add_argument('root', help='dataset directory, e.g. dataset_xy')
+    parser.add_argument('--workers', type=int, default=None, help='decoding processes (default: all cores)')
+    parser.add_argument('--repair', action='store_true', help=f'move bad files and duplicates to {QUARANTINE}/<status>/')
+    parser.add_argument('--verbose', '-v', action='store_true', help='list every file that is not ok')
+    args = parser.parse_args(argv)
+
+    manifest = scan(args.root, workers=args.workers)
+    print(f"{len(manifest['entries'])} images, {manifest['scanned']} scanned in {manifest['scan_time']:.2f} s")
+    for status, n in sorted(report(manifest).items()):
+        print(f"  {status:<14} {n}")
+    if args.verbose:
+        for rel, e in sorted(manifest['entries'].items()):
+            if e['status'] != OK:
+                print(f"{e['status']:<14} {rel}: {e.get('error') or e.get('duplicate_of')}")
+    if args.repair:
+        moved = repair(args.root, manifest)
+        print(f"moved {len(moved)} files to {os.path.join(args.root, QUARANTINE)}")
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
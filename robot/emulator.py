@@ -0,0 +1,209 @@
+from typing import Union
+
+# i2c-dev functionality bits, as smbus2.SMBus.funcs reports them
+I2C_FUNC_I2C = 0x00000001
+I2C_FUNC_SMBUS_I2C_BLOCK = 0x0C000000
+I2C_M_RD = 0x0001
+
+class EmulatorI2CMsg:
+    # the part of smbus2.i2c_msg the driver uses, PCA9685 takes it from bus.i2c_msg
+    def __init__(self, addr, flags, buf) -> None:
+        self.addr = addr
+        self.flags = flags
+        self.buf = buf
+        self.len = len(buf)
+
+    @classmethod
+    def write(cls, address, buf) -> 'EmulatorI2CMsg':
+        return cls(address, 0, list(buf))
+
+    @classmethod
+    def read(cls, address, length) -> 'EmulatorI2CMsg':
+        return cls(address, I2C_M_RD, [0] * length)
+
+    def __iter__(self):
+        return iter(self.buf)
+
+    def __len__(self) -> int:
+        return self.len
+
+class PCA9685Emulator:
+    # SMBus-like stand-in for a PCA9685, usable as PCA9685(bus=PCA9685Emulator())
+    # raw_i2c=False emulates an adapter with SMBus block transfers only (no i2c_rdwr)
+    #
+    # With record=True it also models when outputs change: a bus clock advances 9 bit times per byte at
+    # bus_speed, and a changed channel is latched on the STOP (MODE2.OCH=0) or on the acknowledge of each
+    # byte (OCH=1). A latched value takes effect at the start of the next PWM cycle, as on the chip, and
+    # `latches` lists (cycle, channel, count) for every output change.
+    MODE1         = 0x00
+    MODE2         = 0x01
+    LED0_ON_L     = 0x06
+    PRESCALE      = 0xFE
+    MODE1_AI_MASK = 0x20
+    MODE2_OCH_MASK = 0x08
+    i2c_msg = EmulatorI2CMsg
+
+    def __init__(self, i2c_addr=0x40, record=False, raw_i2c=True, bus_speed=400000) -> None:
+        self.address = i2c_addr
+        self.regs = bytearray(256)
+        # power-on state: MODE1 sleep and all call, MODE2 totem pole, every LED full off, 200 Hz prescale
+        self.regs[self.MODE1] = 0x11
+        self.regs[self.MODE2] = 0x04
+        for channel in range(16):
+            self.regs[self.LED0_ON_L + channel*4 + 3] = 0x10
+        self.regs[self.PRESCALE] = 0x1E
+        self.record = record
+        self.funcs = I2C_FUNC_SMBUS_I2C_BLOCK | (I2C_FUNC_I2C if raw_i2c else 0)
+        self.bus_speed = bus_speed
+        self.clock = 0.0
+        self.latches = []
+        self._outputs = [0] * 16
+        self.trace = []
+        self.write_count = 0
+        self.read_count = 0
+        self.bytes_written = 0
+
+    def write_i2c_block_data(self, addr, reg, data) -> None:
+        self._check_addr(addr)
+        if len(data) > 32:
+            raise OSError("SMBus block write limited to 32 bytes, got {n}".format(n=len(data)))
+        self.write_count += 1
+        self.bytes_written += len(data)
+        if self.record:
+            self.trace.append((reg, list(data)))
+            self._tick(2)
+            self._store_timed(reg, data)
+            self._stop()
+        else:
+            self._store(reg, data)
+
+    def read_i2c_block_data(self, addr, reg, length) -> list:
+        self._check_addr(addr)
+        if length > 32:
+            raise OSError("SMBus block read limited to 32 bytes, got {n}".format(n=length))
+        self.read_count += 1
+        return self._load(reg, length)
+
+    def i2c_rdwr(self, *msgs) -> None:
+        # combined transaction: a write sets the register pointer and stores what follows it,
+        # a read continues from the pointer; no 32-byte limit
+        if not (self.funcs & I2C_FUNC_I2C):
+            raise OSError(95, "Operation not supported: adapter has no plain I2C")
+        reg = 0
+        for msg in msgs:
+            self._check_addr(msg.addr)
+            if msg.flags & I2C_M_RD:
+                self.read_count += 1
+                msg.buf[:] = self._load(reg, msg.len)
+                if self.record:
+                    self._tick(1 + msg.len)
+            else:
+                data = list(msg)
+                if not data:
+                    continue
+                reg, data = data[0], data[1:]
+                if self.record:
+                    # repeated start, no STOP until the last message
+                    self._tick(2)
+                if data:
+                    self.write_count += 1
+                    self.bytes_written += len(data)
+                    if self.record:
+                        self.trace.append((reg, data))
+                        self._store_timed(reg, data)
+                    else:
+                        self._store(reg, data)
+        if self.record:
+            self._stop()
+
+    def write_byte_data(self, addr, reg, value) -> None:
+        self.write_i2c_block_data(addr, reg, [value])
+
+    def read_byte_data(self, addr, reg) -> int:
+        return self.read_i2c_block_data(addr, reg, 1)[0]
+
+    def close(self) -> None:
+        pass
+
+    @property
+    def prescale(self) -> int:
+        return self.regs[self.PRESCALE]
+
+    def duty_counts(self, channel) -> Union[int,None]:
+        # Return the programmed OFF-ON count of a channel, 4096 for full on, 0 for full off
+        r = self.regs[self.LED0_ON_L + channel*4:self.LED0_ON_L + channel*4 + 4]
+        if r[3] & 0x10:
+            return 0
+        if r[1] & 0x10:
+            return 4096
+        on = r[0] | ((r[1] & 0x0F) << 8)
+        off = r[2] | ((r[3] & 0x0F) << 8)
+        return (off - on) % 4096
+
+    @property
+    def period(self) -> float:
+        # PWM period in seconds from the prescale and the 25 MHz oscillator
+        return (self.prescale + 1) * 4096 / 25000000.0
+
+    def advance(self, seconds:float) -> None:
+        # move the bus clock, e.g. by the controller's loop time between commands
+        self.clock += seconds
+
+    def cycles(self, since:int=0) -> list:
+        # distinct PWM cycles in which the outputs latched since latches[since:], one for a synchronized command
+        return sorted({cycle for cycle, _, _ in self.latches[since:]})
+
+    def reset_counters(self) -> None:
+        self.latches = []
+        self.trace = []
+        self.write_count = 0
+        self.read_count = 0
+        self.bytes_written = 0
+
+    def _check_addr(self, addr) -> None:
+        if addr != self.address:
+            raise OSError("No device at I2C address {a:#04x}".format(a=addr))
+
+    def _next_reg(self, reg) -> int:
+        # auto increment only when MODE1.AI is set, wrapping after the last LED register like the chip does
+        if not (self.regs[self.MODE1] & self.MODE1_AI_MASK):
+            return reg
+        if reg == 0x45:
+            return 0x00
+        return (reg + 1) & 0xFF
+
+    def _store(self, reg, data) -> None:
+        for b in data:
+            self.regs[reg] = b & 0xFF
+            reg = self._next_reg(reg)
+
+    def _tick(self, nbytes) -> None:
+        self.clock += nbytes * 9.0 / self.bus_speed
+
+    def _store_timed(self, reg, data) -> None:
+        change_on_ack = self.regs[self.MODE2] & self.MODE2_OCH_MASK
+        for b in data:
+            self.regs[reg] = b & 0xFF
+            reg = self._next_reg(reg)
+            self._tick(1)
+            if change_on_ack:
+                self._latch()
+
+    def _stop(self) -> None:
+        if not (self.regs[self.MODE2] & self.MODE2_OCH_MASK):
+            self._latch()
+
+    def _latch(self) -> None:
+        cycle = int(self.clock / self.period) + 1
+        for channel in range(16):
+            count = self.duty_counts(channel)
+            if count != self._outputs[channel]:
+                self._outputs[channel] = count
+                self.latches.append((cycle, channel, count))
+
+    def _load(self, reg, length) -> list:
+        res = []
+        for _ in range(length):
+            res.append(self.regs[reg])
+            reg = self._next_reg(reg)
+        return res
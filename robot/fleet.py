@@ -0,0 +1,232 @@
+import concurrent.futures
+from typing import Union
+import numpy as np
+from .pca9685 import PCA9685
+
+class _Dispatcher:
+    # Register write plan for a set of (pca, channel) outputs. Outputs on the same chip (same bus and
+    # address, even through different PCA9685 objects) are merged, sorted and split into runs of
+    # consecutive channels, so each command costs one block write per run instead of one per robot.
+    def __init__(self, outputs:list, parallel:bool=False, max_workers:Union[int,None]=None) -> None:
+        chips = {}
+        for index, (pca, channel) in enumerate(outputs):
+            key = (pca.bus_id, pca.address)
+            if key not in chips:
+                chips[key] = (pca, {})
+            if channel in chips[key][1]:
+                raise ValueError(f"channel {channel} of PCA9685 {pca.address:#04x} is driven twice")
+            chips[key][1][channel] = index
+        self.buses = {}
+        for (bus_id, _), (pca, channels) in chips.items():
+            runs = []
+            for channel in sorted(channels):
+                if runs and channel == runs[-1][1][-1] + 1 and len(runs[-1][1]) < pca.block_channels:
+                    runs[-1][1].append(channel)
+                else:
+                    runs.append((pca._get_channel_reg_addr(channel), [channel]))
+            plan = [(reg, np.array([channels[c] for c in run], dtype=np.intp)) for reg, run in runs]
+            self.buses.setdefault(bus_id, []).append((pca, plan))
+        self.writes = sum(len(plan) for chips in self.buses.values() for _, plan in chips)
+        # LEDn_ON offsets set with PCA9685.set_phase/stagger before the fleet was built
+        phases = np.array([pca.phases[channel] for pca, channel in outputs], dtype=np.intp)
+        self.phases = phases if phases.any() else None
+        self._pool = None
+        if parallel and len(self.buses) > 1:
+            self._pool = concurrent.futures.ThreadPoolExecutor(max_workers or len(self.buses), thread_name_prefix='robot-fleet')
+
+    def dispatch(self, counts:np.ndarray) -> None:
+        # counts: one 12-bit count per output, in the order outputs were given
+        data = REG_TABLE[counts]
+        if self.phases is not None:
+            _shift_phase(data, counts, self.phases)
+        if self._pool is None:
+            for chips in self.buses.values():
+                self._write_bus(chips, data)
+        else:
+            # one task per adapter, transfers on different adapters can overlap when the driver releases the GIL
+            futures = [self._pool.submit(self._write_bus, chips, data) for chips in self.buses.values()]
+            for f in futures:
+                f.result()
+
+    @staticmethod
+    def _write_bus(chips:list, data:np.ndarray) -> None:
+        # the runs of one chip go out as one combined transaction when the bus has raw I2C
+        for pca, plan in chips:
+            with pca.batch():
+                for reg, index in plan:
+                    pca._write_reg(reg, data[index].ravel().tolist())
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+# register bytes of every 12-bit count, as PCA9685._cal_on_off_count
+REG_TABLE = np.array([PCA9685._cal_on_off_count(PCA9685, c) for c in range(4097)], dtype=np.uint8)
+
+def _shift_phase(data:np.ndarray, counts:np.ndarray, phases:np.ndarray) -> None:
+    # as PCA9685._cal_on_off_count with a phase: ON at the offset, OFF count steps later; full off stays
+    shifted = (counts != 0) & (phases != 0)
+    phase = phases[shifted]
+    off = (phase + np.minimum(counts[shifted], 4095)) % 4096
+    data[shifted, 0] = phase & 0xFF
+    data[shifted, 1] = phase >> 8
+    data[shifted, 2] = off & 0xFF
+    data[shifted, 3] = off >> 8
+
+def _snap(x:np.ndarray, scale:np.ndarray) -> np.ndarray:
+    # commands snapped to the LookupTable grid, so arrays give the same counts as the per-robot tables
+    index = np.floor((np.clip(x, -1.0, 1.0) + 1.0) * scale + 0.5)
+    return index / scale - 1.0
+
+def _quantize(duty:np.ndarray) -> np.ndarray:
+    # same quantization as duty_to_count, int() truncates like the scalar path
+    return np.clip((duty * 4096).astype(np.intp), 0, 4096)
+
+class JetBotArray:
+    # Drive N JetBots with arrays of speeds. The alpha/beta gain, clamping and quantization run as
+    # one NumPy pass and the register writes are grouped per chip; see _Dispatcher.
+    # Motors with a custom calibration curve go through their own lookup table instead.
+    def __init__(self, robots:list, parallel:bool=False, max_workers:Union[int,None]=None) -> None:
+        self.robots = list(robots)
+        self.motors = [m for r in self.robots for m in (r.left_motor, r.right_motor)]
+        outputs = []
+        for m in self.motors:
+            outputs += [(m.pca, m.a), (m.pca, m.b)]
+        self.dispatcher = _Dispatcher(outputs, parallel, max_workers)
+        self._dirty = True
+        for m in self.motors:
+            m.observe(self._mark_dirty, names=['alpha', 'beta', 'curve'])
+
+    def __len__(self) -> int:
+        return len(self.robots)
+
+    def cal_counts(self, left_speed, right_speed) -> np.ndarray:
+        # (N, 4) counts: left a, left b, right a, right b
+        if self._dirty:
+            self._refresh()
+        n = len(self.robots)
+        speed = np.empty((n, 2))
+        speed[:, 0] = left_speed
+        speed[:, 1] = right_speed
+        speed = _snap(speed.ravel(), self._scale)
+        value = np.clip(speed * self._alpha + self._beta, -1.0, 1.0)
+        count = _quantize(np.abs(value))
+        counts = np.zeros((2 * n, 2), dtype=np.intp)
+        forward = value > 0
+        counts[forward, 1] = count[forward]
+        counts[~forward, 0] = count[~forward]
+        for i in self._curved:
+            counts[i] = self.motors[i].cal_counts(float(speed[i]))
+        return counts.reshape(n, 4)
+
+    def set_motors(self, left_speed, right_speed) -> None:
+        # speeds are arrays of N values or scalars applied to every robot
+        counts = self.cal_counts(left_speed, right_speed)
+        for r in self._fed:
+            r.watchdog.feed()
+        self.dispatcher.dispatch(counts.ravel())
+
+    def forward(self, speed) -> None:
+        self.set_motors(speed, speed)
+
+    def backward(self, speed) -> None:
+        self.set_motors(-np.asarray(speed), -np.asarray(speed))
+
+    def stop(self) -> None:
+        self.set_motors(0.0, 0.0)
+
+    def close(self) -> None:
+        self.dispatcher.close()
+
+    @property
+    def _fed(self) -> list:
+        return [r for r in self.robots if getattr(r, 'watchdog', None) is not None]
+
+    def _mark_dirty(self, change) -> None:
+        self._dirty = True
+
+    def _refresh(self) -> None:
+        self._alpha = np.array([m.alpha for m in self.motors])
+        self._beta = np.array([m.beta for m in self.motors])
+        self._scale = np.array([(m.table_resolution - 1) / 2.0 for m in self.motors])
+        self._curved = [i for i, m in enumerate(self.motors) if m.curve is not None]
+        self._dirty = False
+
+class JetRacerArray:
+    # Drive N JetRacers with arrays of steering and throttle. The two-slope servo map, duty clamping
+    # and quantization run as one NumPy pass and the register writes are grouped per chip.
+    # Servos with a custom calibration curve go through their own lookup table instead.
+    def __init__(self, robots:list, parallel:bool=False, max_workers:Union[int,None]=None) -> None:
+        self.robots = list(robots)
+        self.servos = [s for r in self.robots for s in (r.servo, r.motor)]
+        self.dispatcher = _Dispatcher([(s.pca, s.channel) for s in self.servos], parallel, max_workers)
+        self._dirty = True
+        self._pos = np.zeros(2 * len(self.robots))
+        for s in self.servos:
+            s.observe(self._mark_dirty, names=['alpha0', 'alpha1', 'beta', 'min_duty_cycle', 'max_duty_cycle', 'curve'])
+
+    def __len__(self) -> int:
+        return len(self.robots)
+
+    def cal_counts(self, steering, throttle) -> np.ndarray:
+        # (N, 2) counts: steering, throttle
+        if self._dirty:
+            self._refresh()
+        pos = self._pos.reshape(-1, 2)
+        if steering is not None:
+            pos[:, 0] = steering
+        if throttle is not None:
+            pos[:, 1] = throttle
+        pos = _snap(self._pos, self._scale)
+        duty = np.clip(pos * np.where(pos > 0, self._alpha0, self._alpha1) + self._beta, self._min, self._max)
+        counts = _quantize(duty)
+        for i in self._curved:
+            counts[i] = self.servos[i].cal_count(float(pos[i]))
+        return counts.reshape(-1, 2)
+
+    def set(self, steering=None, throttle=None) -> None:
+        # arrays of N values or scalars; None keeps the last command for that axis
+        counts = self.cal_counts(steering, throttle)
+        for r in self._fed:
+            r.watchdog.feed()
+        self.dispatcher.dispatch(counts.ravel())
+
+    @property
+    def steering(self) -> np.ndarray:
+        return self._pos.reshape(-1, 2)[:, 0].copy()
+
+    @steering.setter
+    def steering(self, value) -> None:
+        self.set(steering=value)
+
+    @property
+    def throttle(self) -> np.ndarray:
+        return self._pos.reshape(-1, 2)[:, 1].copy()
+
+    @throttle.setter
+    def throttle(self, value) -> None:
+        self.set(throttle=value)
+
+    def stop(self) -> None:
+        self.set(0.0, 0.0)
+
+    def close(self) -> None:
+        self.dispatcher.close()
+
+    @property
+    def _fed(self) -> list:
+        return [r for r in self.robots if getattr(r, 'watchdog', None) is not None]
+
+    def _mark_dirty(self, change) -> None:
+        self._dirty = True
+
+    def _refresh(self) -> None:
+        self._alpha0 = np.array([s.alpha0 for s in self.servos])
+        self._alpha1 = np.array([s.alpha1 for s in self.servos])
+        self._beta = np.array([s.beta for s in self.servos])
+        self._scale = np.array([(s.table_resolution - 1) / 2.0 for s in self.servos])
+        self._min = np.array([s.min_duty_cycle for s in self.servos])
+        self._max = np.array([s.max_duty_cycle for s in self.servos])
+        self._curved = [i for i, s in enumerate(self.servos) if s.curve is not None]
+        self._dirty = False
@@ -0,0 +1,136 @@
+import threading
+import time
+from typing import Union
+import numpy as np
+
+class Frame:
+    # Lease on one pool buffer. Producers get a writable lease from acquire() and hand it over with
+    # FramePool.publish(); consumers get read-only views from FramePool.latest(). The buffer goes back
+    # to the pool when the last lease is released.
+    __slots__ = ('pool', 'index', 'array', 'seq', 'timestamp', '_released')
+
+    def __init__(self, pool:'FramePool', index:int, array:np.ndarray, seq:int, timestamp:float) -> None:
+        self.pool = pool
+        self.index = index
+        self.array = array
+        self.seq = seq
+        self.timestamp = timestamp
+        self._released = False
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self.pool._release(self.index)
+
+    def __array__(self, dtype=None, copy=None):
+        return self.array if dtype is None else self.array.astype(dtype)
+
+    def __enter__(self) -> 'Frame':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+    def __del__(self):
+        # a forgotten lease must not leak the buffer forever
+        try:
+            self.release()
+        except Exception:
+            pass
+
+class FramePool:
+    # Fixed ring of preallocated frame buffers with reference counted leases and frame sequence numbers.
+    # One producer fills buffers in place (acquire -> fill -> publish, or write(image) when the source
+    # can't fill in place) and any number of consumers lease the latest frame without copying it.
+    def __init__(self, shape:tuple=(224, 224, 3), dtype=np.uint8, size:int=8) -> None:
+        if size < 2:
+            raise ValueError(f"frame pool size {size} should be at least 2")
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.size = size
+        self.buffers = [np.empty(self.shape, self.dtype) for _ in range(size)]
+        self._views = []
+        for b in self.buffers:
+            v = b.view()
+            v.flags.writeable = False
+            self._views.append(v)
+        self._refs = [0] * size
+        self._seqs = [0] * size
+        self._times = [0.0] * size
+        self._latest = None
+        self._seq = 0
+        self._next = 0
+        self._lock = threading.Lock()
+        self._published = threading.Condition(self._lock)
+
+    @property
+    def seq(self) -> int:
+        # sequence number of the latest published frame, 0 before the first one
+        return self._seq
+
+    def acquire(self) -> Frame:
+        # writable buffer for the producer, never the latest frame or one still leased
+        with self._lock:
+            for i in range(self.size):
+                index = (self._next + i) % self.size
+                if self._refs[index] == 0 and index != self._latest:
+                    self._next = (index + 1) % self.size
+                    self._refs[index] = 1
+                    return Frame(self, index, self.buffers[index], 0, 0.0)
+        raise RuntimeError(f"all {self.size} frame buffers are leased, release frames or enlarge the pool")
+
+    def publish(self, frame:Frame, timestamp:Union[float,None]=None) -> int:
+        # make a filled buffer the latest frame, releases the producer lease; returns its sequence number
+        if frame.pool is not self or frame.array is not self.buffers[frame.index]:
+            raise ValueError("only writable frames from acquire() of this pool can be published")
+        with self._lock:
+            self._seq += 1
+            self._seqs[frame.index] = self._seq
+            self._times[frame.index] = time.monotonic() if timestamp is None else timestamp
+            self._latest = frame.index
+            self._published.notify_all()
+            seq = self._seq
+        frame.release()
+        return seq
+
+    def write(self, image:np.ndarray, timestamp:Union[float,None]=None) -> int:
+        # copy an image into the next free buffer and publish it
+        frame = self.acquire()
+        try:
+            np.copyto(frame.array, image)
+        except BaseException:
+            frame.release()
+            raise
+        return self.publish(frame, timestamp)
+
+    def latest(self, newer_than:Union[int,None]=None, timeout:Union[float,None]=None) -> Union[Frame,None]:
+        # read-only lease on the latest frame, None before the first one; with newer_than, wait up to timeout
+        # (None: no limit) for a frame after that seq, e.g. latest(0) waits for the first frame
+        with self._lock:
+            if newer_than is None:
+                newer_than = 0
+            elif self._seq <= newer_than and timeout != 0:
+                self._published.wait_for(lambda: self._seq > newer_than, timeout)
+            if self._latest is None or self._seq <= newer_than:
+                return None
+            index = self._latest
+            self._refs[index] += 1
+            return Frame(self, index, self._views[index], self._seqs[index], self._times[index])
+
+    def copy(self, frame:Union[Frame,np.ndarray]) -> Frame:
+        # writable copy of a frame in a pool buffer, for drawing overlays without allocating; it keeps the
+        # source timestamp but not its seq, which names the published pixels and not the ones drawn over
+        src = frame.array if isinstance(frame, Frame) else frame
+        lease = self.acquire()
+        np.copyto(lease.array, src)
+        if isinstance(frame, Frame):
+            lease.timestamp = frame.timestamp
+        return lease
+
+    def leased(self) -> int:
+        with self._lock:
+            return sum(1 for r in self._refs if r > 0)
+
+    def _release(self, index:int) -> None:
+        with self._lock:
+            self._refs[index] -= 1
@@ -0,0 +1,251 @@
+import collections
+import concurrent.futures
+import hashlib
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Union
+import torch
+import torchvision
+from . import trace
+
+# Inference engines for the steering ResNet-18 (`best_steering_model_xy.pth` and friends).
+# Every engine takes the preprocessed NCHW float batch that utils.preprocess returns and gives back the
+# output on the host, so latency is measured the same way for all of them: from calling the engine to
+# having `model(image).detach().cpu()` in hand, which is what the deploy notebooks do.
+
+CACHE_DIR = os.path.join(str(Path.home()), '.cache', 'robot', 'inference')
+
+def build_model(outputs:int=2) -> torch.nn.Module:
+    model = torchvision.models.resnet18()
+    model.fc = torch.nn.Linear(512, outputs)
+    return model
+
+def weights_hash(path:str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def cache_name(weights:str, input_shape:tuple, ext:str) -> str:
+    # cached graphs are traced for one input size with one torch release (which also picks the ONNX opset),
+    # so both are part of the name next to the weight hash
+    shape = 'x'.join(str(d) for d in input_shape)
+    return f"{weights_hash(weights)}-{shape}-{torch.__version__}{ext}"
+
+class InferenceEngine:
+    backend = None
+
+    def __init__(self, input_shape:tuple=(3, 224, 224), max_batch:int=4, history:int=1000) -> None:
+        self.input_shape = tuple(input_shape)
+        self.max_batch = max_batch
+        self.latencies = collections.deque(maxlen=history)
+        self.load_time = 0.0
+        self.cache_hit = False
+
+    def __call__(self, batch:torch.Tensor) -> torch.Tensor:
+        st = time.perf_counter()
+        if trace.enabled:
+            with trace.span('inference.' + self.backend, batch=batch.shape[0]):
+                out = self._run(batch)
+        else:
+            out = self._run(batch)
+        self.latencies.append((time.perf_counter() - st, batch.shape[0]))
+        return out
+
+    def warmup(self, passes:int=3) -> None:
+        # first passes pay for allocator growth, kernel selection and lazy init; keep them out of the stats
+        for batch in sorted({1, self.max_batch}):
+            data = torch.zeros((batch,) + self.input_shape)
+            for _ in range(passes):
+                self._run(data)
+
+    def stats(self) -> dict:
+        # per call latency in milliseconds, and per image for batched calls
+        res = {'backend': self.backend, 'calls': len(self.latencies), 'load_time': self.load_time, 'cache_hit': self.cache_hit}
+        if self.latencies:
+            calls = sorted(l for l, _ in self.latencies)
+            images = sum(n for _, n in self.latencies)
+            res['latency_ms'] = {
+                'min': calls[0] * 1e3,
+                'median': calls[len(calls) // 2] * 1e3,
+                'p99': calls[min(len(calls) - 1, int(len(calls) * 0.99))] * 1e3,
+                'max': calls[-1] * 1e3,
+                'per_image': sum(calls) / images * 1e3,
+            }
+        return res
+
+    def _run(self, batch:torch.Tensor) -> torch.Tensor:
+        raise NotImplementedError
+
+class TorchScriptEngine(InferenceEngine):
+    # CPU backend: the eager model traced, frozen and optimized with TorchScript, cached on disk by weight hash,
+    # input shape and torch version
+    backend = 'torchscript'
+
+    def __init__(self, weights:str, cache_dir:str=CACHE_DIR, threads:Union[int,None]=None, **kwargs) -> None:
+        super().__init__(**kwargs)
+        if threads is not None:
+            torch.set_num_threads(threads)
+        st = time.perf_counter()
+        os.makedirs(cache_dir, exist_ok=True)
+        cache_path = os.path.join(cache_dir, cache_name(weights, self.input_shape, '.ts'))
+        if os.path.isfile(cache_path):
+            module = torch.jit.load(cache_path, map_location='cpu')
+            self.cache_hit = True
+        else:
+            state_dict = torch.load(weights, map_location='cpu')
+            model = build_model(state_dict['fc.weight'].shape[0])
+            model.load_state_dict(state_dict)
+            model.eval()
+            with torch.no_grad():
+                traced = torch.jit.trace(model, torch.zeros((1,) + self.input_shape))
+            module = torch.jit.freeze(traced)
+            tmp_path = cache_path + f".{os.getpid()}.tmp"
+            torch.jit.save(module, tmp_path)
+            os.replace(tmp_path, cache_path)
+        # the optimized graph holds prepacked weights that can't be saved, so this runs on every load
+        self.module = torch.jit.optimize_for_inference(module)
+        self.load_time = time.perf_counter() - st
+
+    def _run(self, batch:torch.Tensor) -> torch.Tensor:
+        with torch.no_grad():
+            return self.module(batch.float().cpu())
+
+class OnnxRuntimeEngine(InferenceEngine):
+    # CPU backend through ONNX Runtime, the exported graph is cached on disk by weight hash, input shape and
+    # torch version
+    backend = 'onnxruntime'
+
+    def __init__(self, weights:str, cache_dir:str=CACHE_DIR, threads:Union[int,None]=None, **kwargs) -> None:
+        import onnxruntime
+        super().__init__(**kwargs)
+        st = time.perf_counter()
+        os.makedirs(cache_dir, exist_ok=True)
+        cache_path = os.path.join(cache_dir, cache_name(weights, self.input_shape, '.onnx'))
+        if os.path.isfile(cache_path):
+            self.cache_hit = True
+        else:
+            state_dict = torch.load(weights, map_location='cpu')
+            model = build_model(state_dict['fc.weight'].shape[0])
+            model.load_state_dict(state_dict)
+            model.eval()
+            tmp_path = cache_path + f".{os.getpid()}.tmp"
+            torch.onnx.export(model, torch.zeros((1,) + self.input_shape), tmp_path,
+                              input_names=['input'], output_names=['output'],
+                              dynamic_axes={'input': {0: 'batch'}, 'output': {0: 'batch'}})
+            os.replace(tmp_path, cache_path)
+        options = onnxruntime.SessionOptions()
+        if threads is not None:
+            options.intra_op_num_threads = threads
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(cache_path, options, providers=['CPUExecutionProvider'])
+        self.load_time = time.perf_counter() - st
+
+    def _run(self, batch:torch.Tensor) -> torch.Tensor:
+        out = self.session.run(None, {'input': batch.float().cpu().numpy()})[0]
+        return torch.from_numpy(out)
+
+class TRTEngine(InferenceEngine):
+    # Jetson backend: the torch2trt module saved by the build_trt notebooks
+    backend = 'tensorrt'
+
+    def __init__(self, trt_weights:str, **kwargs) -> None:
+        from torch2trt import TRTModule
+        kwargs.setdefault('max_batch', 1)
+        super().__init__(**kwargs)
+        st = time.perf_counter()
+        self.module = TRTModule()
+        self.module.load_state_dict(torch.load(trt_weights))
+        self.load_time = time.perf_counter() - st
+
+    def warmup(self, passes:int=3) -> None:
+        # the notebooks build the TRT engine for batch 1
+        data = torch.zeros((1,) + self.input_shape).cuda().half()
+        for _ in range(passes):
+            self._run(data)
+
+    def _run(self, batch:torch.Tensor) -> torch.Tensor:
+        if trace.enabled:
+            # CUDA runs asynchronously, the forward span is the launch and the copy span waits for the result
+            with trace.span('inference.forward'):
+                out = self.module(batch.cuda().half())
+            with trace.span('inference.to_cpu'):
+                return out.detach().float().cpu()
+        return self.module(batch.cuda().half()).detach().float().cpu()
+
+def create_engine(weights:str, backend:str='auto', **kwargs) -> InferenceEngine:
+    # backend: 'tensorrt' (weights is the *_trt.pth file), 'onnxruntime', 'torchscript', or 'auto' which
+    # picks ONNX Runtime when installed and TorchScript otherwise for plain .pth weights
+    if backend == 'tensorrt':
+        return TRTEngine(weights, **kwargs)
+    if backend == 'auto':
+        try:
+            import onnxruntime
+            backend = 'onnxruntime'
+        except ImportError:
+            backend = 'torchscript'
+    if backend == 'onnxruntime':
+        return OnnxRuntimeEngine(weights, **kwargs)
+    if backend == 'torchscript':
+        return TorchScriptEngine(weights, **kwargs)
+    raise ValueError(f"inference backend {backend} not supported")
+
+class MicroBatcher:
+    # Collects single frames from several camera streams into one batch per engine call.
+    # submit() returns a Future with that frame's output row; a batch is run when max_batch frames
+    # are waiting or the oldest has waited max_wait seconds.
+    def __init__(self, engine:InferenceEngine, max_batch:Union[int,None]=None, max_wait:float=0.005) -> None:
+        self.engine = engine
+        self.max_batch = max_batch or engine.max_batch
+        self.max_wait = max_wait
+        self.batches = 0
+        self._queue = []
+        self._cond = threading.Condition()
+        self._running = True
+        self._thread = threading.Thread(target=self._worker, name='robot-microbatch', daemon=True)
+        self._thread.start()
+
+    def submit(self, image:torch.Tensor) -> concurrent.futures.Future:
+        # image is one preprocessed frame, (1, 3, H, W) or (3, H, W)
+        future = concurrent.futures.Future()
+        if image.dim() == 4:
+            image = image[0]
+        with self._cond:
+            if not self._running:
+                raise RuntimeError("micro batcher is closed")
+            self._queue.append((time.perf_counter(), image, future))
+            self._cond.notify()
+        return future
+
+    def close(self) -> None:
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self._thread.join()
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                while self._running and not self._queue:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                deadline = self._queue[0][0] + self.max_wait
+                while self._running and len(self._queue) < self.max_batch:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                items = self._queue[:self.max_batch]
+                del self._queue[:self.max_batch]
+            try:
+                out = self.engine(torch.stack([image for _, image, _ in items]))
+                self.batches += 1
+                for i, (_, _, future) in enumerate(items):
+                    future.set_result(out[i])
+            except Exception as e:
+                for _, _, future in items:
+                    future.set_exception(e)
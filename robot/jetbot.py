@@ -3,33 +3,72 @@ import traitlets
 from traitlets.config.configurable import Configurable, HasTraits
 from .pca9685 import PCA9685
 from .motor import Motor
+from .config import ConfigStore, JETBOT_SCHEMA, DEFAULT_ROBOT
+from . import trace
 from typing import Union
 import os
 from pathlib import Path
 import json
 
 class JetBot:
-    def __init__(self, bus=1, motor_freq=1600, left_a=0, left_b=1, right_a=2, right_b=3) -> None:
-        self.pca = PCA9685(bus=bus)
+    def __init__(self, bus=1, motor_freq=1600, left_a=0, left_b=1, right_a=2, right_b=3, name=DEFAULT_ROBOT, profile=None, i2c_addr=0x40, sync_outputs=False, conf_store=None) -> None:
+        self.pca = PCA9685(bus=bus, i2c_addr=i2c_addr, sync_outputs=sync_outputs)
         self.pca.frequency = motor_freq
+        if sync_outputs:
+            self.pca.configure_mode2(change_on_ack=False)
         self.left_motor = Motor(self.pca, left_a, left_b)
         self.right_motor = Motor(self.pca, right_a, right_b)
         self.lrab_continuous = ((left_a + 1) == left_b) and ((left_b + 1) == right_a) and ((right_a + 1) == right_b)
-        self.conf_path = str(Path.home()) + "/jetbot_conf.json"
-        if not os.path.isfile(self.conf_path):
+        self.watchdog = None
+        self._trips = 0
+        # conf_store: a ConfigStore to use instead of ~/jetbot_conf.json, e.g. a MemoryConfigStore
+        if conf_store is None:
+            conf_store = ConfigStore.open(str(Path.home()) + "/jetbot_conf.json", JETBOT_SCHEMA)
+        self.conf_store = conf_store
+        self.conf_path = conf_store.path
+        self.name = name
+        self.profile = profile
+        conf = self.conf_store.load(self.name, self.profile)
+        if conf is None:
             self.right_motor.alpha = -1
             self.save_conf()
         else:
-            self.load_conf()
+            self._apply_conf(conf)
 
+    @trace.traced('jetbot.set_motors')
     def set_motors(self, left_speed:Union[float,int], right_speed:Union[float,int]) -> None:
+        resume = False
+        if self.watchdog is not None:
+            self.watchdog.feed()
+            if self.watchdog.trips != self._trips:
+                # the watchdog stopped the motors behind the traits and filters, write this command whatever it is
+                self._trips = self.watchdog.trips
+                resume = True
+                for motor in (self.left_motor, self.right_motor):
+                    if motor.output_filter is not None:
+                        motor.output_filter.reset()
         if self.lrab_continuous:
-            left_pwm = self.left_motor.cal_ab(left_speed)
-            right_pwm = self.right_motor.cal_ab(right_speed)
-            self.pca[self.left_motor.a:self.right_motor.b+1] = left_pwm + right_pwm
+            left_filter, right_filter = self.left_motor.output_filter, self.right_motor.output_filter
+            if left_filter is not None or right_filter is not None:
+                left = left_speed if left_filter is None else left_filter(left_speed)
+                right = right_speed if right_filter is None else right_filter(right_speed)
+                if left is None and right is None:
+                    return
+                # one block write, a suppressed side rewrites the value it already has
+                left_speed = left_filter.last if left is None else left
+                right_speed = right_filter.last if right is None else right
+            left_counts = self.left_motor.cal_counts(left_speed)
+            right_counts = self.right_motor.cal_counts(right_speed)
+            self.pca.set_counts(self.left_motor.a, left_counts + right_counts)
         else:
-            self.left_motor.value = left_speed
-            self.right_motor.value = right_speed
+            # both motors in one transaction, with sync_outputs they change in the same PWM cycle
+            with self.pca.batch():
+                if resume:
+                    self.left_motor.rewrite(left_speed)
+                    self.right_motor.rewrite(right_speed)
+                else:
+                    self.left_motor.value = left_speed
+                    self.right_motor.value = right_speed
 
     def forward(self, speed:Union[float,int]) -> None:
         self.set_motors(speed, speed)
@@ -49,15 +88,29 @@ class JetBot:
     def release(self):
         self.stop()
 
+    def stop_blocks(self) -> list:
+        # register writes that stop both motors, used by the watchdog
+        left = self.left_motor.cal_counts(0)
+        right = self.right_motor.cal_counts(0)
+        return self.pca.counts_blocks({
+            self.left_motor.a: left[0], self.left_motor.b: left[1],
+            self.right_motor.a: right[0], self.right_motor.b: right[1]
+        })
+
     def load_conf(self):
-        with open(self.conf_path) as f:
-            conf = json.load(f)
-            self.left_motor.alpha = conf['left_motor']['alpha']
-            self.left_motor.beta = conf['left_motor']['beta']
-            self.right_motor.alpha = conf['right_motor']['alpha']
-            self.right_motor.beta = conf['right_motor']['beta']
+        conf = self.conf_store.load(self.name, self.profile)
+        if conf is None:
+            raise FileNotFoundError(f"no calibration for {self.name}/{self.profile or 'active profile'} in {self.conf_path}")
+        self._apply_conf(conf)
+
+    def _apply_conf(self, conf):
+        self.left_motor.alpha = conf['left_motor']['alpha']
+        self.left_motor.beta = conf['left_motor']['beta']
+        self.right_motor.alpha = conf['right_motor']['alpha']
+        self.right_motor.beta = conf['right_motor']['beta']
 
-    def save_conf(self):
+    def save_conf(self, sync=False):
+        # writes are debounced; pass sync=True (or call conf_store.flush()) to write immediately
         conf = {
             'left_motor':{
                 'alpha': self.left_motor.alpha,
@@ -68,5 +121,4 @@ class JetBot:
                 'beta': self.right_motor.beta
             }
         }
-        with open(self.conf_path, 'w', encoding='utf-8') as f:
-            json.dump(conf, f, ensure_ascii=False, indent=4)
+        self.conf_store.save(conf, self.name, self.profile, sync=sync)
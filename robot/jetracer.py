@@ -3,6 +3,8 @@ import traitlets
 from traitlets.config.configurable import Configurable, HasTraits
 from .pca9685 import PCA9685
 from .motor import Servo
+from .config import ConfigStore, JETRACER_SCHEMA, DEFAULT_ROBOT
+from . import trace
 from typing import Union
 import os
 from pathlib import Path
@@ -12,44 +14,112 @@ class JetRacer(HasTraits):
     steering = traitlets.Float()
     throttle = traitlets.Float()
 
-    def __init__(self, bus=1, signal_freq=50, servo_channel=0, motor_channel=1) -> None:
-        self.pca = PCA9685(bus=bus)
+    def __init__(self, bus=1, signal_freq=50, servo_channel=0, motor_channel=1, name=DEFAULT_ROBOT, profile=None, i2c_addr=0x40, sync_outputs=False, conf_store=None) -> None:
+        self.pca = PCA9685(bus=bus, i2c_addr=i2c_addr, sync_outputs=sync_outputs)
         self.pca.frequency = signal_freq
+        if sync_outputs:
+            self.pca.configure_mode2(change_on_ack=False)
         self.servo = Servo(self.pca, servo_channel)
         self.motor = Servo(self.pca, motor_channel)
-        self.conf_path = str(Path.home()) + "/jetracer_conf.json"
-        if not os.path.isfile(self.conf_path):
+        self.watchdog = None
+        self._trips = 0
+        self._trace_start = 0
+        # conf_store: a ConfigStore to use instead of ~/jetracer_conf.json, e.g. a MemoryConfigStore
+        if conf_store is None:
+            conf_store = ConfigStore.open(str(Path.home()) + "/jetracer_conf.json", JETRACER_SCHEMA)
+        self.conf_store = conf_store
+        self.conf_path = conf_store.path
+        self.name = name
+        self.profile = profile
+        conf = self.conf_store.load(self.name, self.profile)
+        if conf is None:
             self.save_conf()
         else:
-            self.load_conf()
+            self._apply_conf(conf)
+
+    @traitlets.validate('steering', 'throttle')
+    def _validate_command(self, proposal):
+        # runs on every assignment, also when the value is unchanged, so a steady command keeps feeding
+        if self.watchdog is not None:
+            self.watchdog.feed()
+            if self.watchdog.trips != self._trips:
+                # the watchdog stopped the car behind the traits, restore the commanded outputs; a changed
+                # value is then written by the observer as usual
+                self._trips = self.watchdog.trips
+                with self.pca.batch():
+                    self.servo.rewrite(self.steering)
+                    self.motor.rewrite(self.throttle)
+        if trace.enabled:
+            # start of the assignment, the observer closes the traitlets dispatch span
+            self._trace_start = trace.now()
+        return proposal['value']
 
     @traitlets.observe('steering')
     def _observe_steering(self, change):
-        self.servo.value = change['new']
+        if trace.enabled:
+            if self._trace_start:
+                trace.record('jetracer.dispatch', self._trace_start)
+                self._trace_start = 0
+            with trace.span('jetracer.steering'):
+                self.servo.value = change['new']
+        else:
+            self.servo.value = change['new']
 
     @traitlets.observe('throttle')
     def _observe_throttle(self, change):
-        self.motor.value = change['new']
+        if trace.enabled:
+            if self._trace_start:
+                trace.record('jetracer.dispatch', self._trace_start)
+                self._trace_start = 0
+            with trace.span('jetracer.throttle'):
+                self.motor.value = change['new']
+        else:
+            self.motor.value = change['new']
     
+    def drive(self, steering:float, throttle:float) -> None:
+        # steering and throttle in one transaction, with sync_outputs they change in the same PWM cycle
+        with self.pca.batch():
+            self.steering = steering
+            self.throttle = throttle
+
     def stop(self) -> None:
-        self.servo.value = 0
-        self.motor.value = 0
+        # neutral outputs are written even when the traits are already 0; the traits follow, so the next
+        # command is written even if it repeats the one before the stop
+        if self.watchdog is not None:
+            self._trips = self.watchdog.trips
+        with self.pca.batch():
+            self.servo.rewrite(0.0)
+            self.motor.rewrite(0.0)
+            self.steering = 0.0
+            self.throttle = 0.0
+
+    def stop_blocks(self) -> list:
+        # register writes that center the steering and set neutral throttle, used by the watchdog
+        return self.pca.counts_blocks({
+            self.servo.channel: self.servo.cal_count(0),
+            self.motor.channel: self.motor.cal_count(0)
+        })
 
     def load_conf(self):
-        with open(self.conf_path) as f:
-            conf = json.load(f)
-            self.servo.alpha0 = conf['servo']['alpha0']
-            self.servo.alpha1 = conf['servo']['alpha1']
-            self.servo.beta = conf['servo']['beta']
-            self.servo.min_duty_cycle = conf['servo']['min_duty']
-            self.servo.max_duty_cycle = conf['servo']['max_duty']
-            self.motor.alpha0 = conf['motor']['alpha0']
-            self.servo.alpha1 = conf['servo']['alpha1']
-            self.motor.beta = conf['motor']['beta']
-            self.motor.min_duty_cycle = conf['motor']['min_duty']
-            self.motor.max_duty_cycle = conf['motor']['max_duty']
+        conf = self.conf_store.load(self.name, self.profile)
+        if conf is None:
+            raise FileNotFoundError(f"no calibration for {self.name}/{self.profile or 'active profile'} in {self.conf_path}")
+        self._apply_conf(conf)
+
+    def _apply_conf(self, conf):
+        self.servo.alpha0 = conf['servo']['alpha0']
+        self.servo.alpha1 = conf['servo']['alpha1']
+        self.servo.beta = conf['servo']['beta']
+        self.servo.min_duty_cycle = conf['servo']['min_duty']
+        self.servo.max_duty_cycle = conf['servo']['max_duty']
+        self.motor.alpha0 = conf['motor']['alpha0']
+        self.motor.alpha1 = conf['motor']['alpha1']
+        self.motor.beta = conf['motor']['beta']
+        self.motor.min_duty_cycle = conf['motor']['min_duty']
+        self.motor.max_duty_cycle = conf['motor']['max_duty']
 
-    def save_conf(self):
+    def save_conf(self, sync=False):
+        # writes are debounced; pass sync=True (or call conf_store.flush()) to write immediately
         conf = {
             'servo':{
                 'alpha0': self.servo.alpha0,
@@ -66,5 +136,4 @@ class JetRacer(HasTraits):
                 'max_duty': self.motor.max_duty_cycle
             }
         }
-        with open(self.conf_path, 'w', encoding='utf-8') as f:
-            json.dump(conf, f, ensure_ascii=False, indent=4)
\ No newline at end of file
+        self.conf_store.save(conf, self.name, self.profile, sync=sync)
\ No newline at end of file
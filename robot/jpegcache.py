@@ -0,0 +1,120 @@
+import base64
+import collections
+import threading
+from typing import Union
+import cv2
+import numpy as np
+
+class JpegCache:
+    # Encode-once JPEG cache shared by the preview widget, snapshots and dataset saving.
+    # Only published (read-only) robot.framepool.Frame leases are cached, keyed by (pool, seq, quality): their
+    # pixels can't change under a sequence number. Writable leases and plain arrays (e.g. camera.value, which
+    # a camera callback may refill in place) are encoded on every call. The oldest entries are dropped past
+    # max_entries.
+    def __init__(self, quality:int=95, max_entries:int=16) -> None:
+        # quality 95 is the cv2 default used by jetcam's bgr8_to_jpeg and by cv2.imwrite
+        if not (0 <= quality <= 100):
+            raise ValueError(f"JPEG quality {quality} out of range, should be within 0 to 100")
+        self.quality = quality
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def encode(self, frame, quality:Union[int,None]=None) -> bytes:
+        # JPEG bytes of the frame, usable directly as traitlets.dlink(..., transform=cache.encode)
+        return self._entry(frame, quality)[1]
+
+    def encode_b64(self, frame, quality:Union[int,None]=None) -> str:
+        entry = self._entry(frame, quality)
+        if entry[2] is None:
+            entry[2] = base64.b64encode(entry[1]).decode('ascii')
+        return entry[2]
+
+    def write(self, frame, path:str, quality:Union[int,None]=None) -> None:
+        # save to disk without re-encoding a frame that was already previewed
+        with open(path, 'wb') as f:
+            f.write(self.encode(frame, quality))
+
+    def overlay(self, frame, overlay:'Overlay', quality:Union[int,None]=None) -> bytes:
+        # SVG of the cached base JPEG with the overlay drawn on top, for ipywidgets.Image(format='svg+xml')
+        array = getattr(frame, 'array', frame)
+        height, width = array.shape[:2]
+        return overlay.to_svg(width, height, self.encode_b64(frame, quality))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _entry(self, frame, quality:Union[int,None]) -> list:
+        quality = self.quality if quality is None else quality
+        seq = getattr(frame, 'seq', 0)
+        key = None
+        if seq and hasattr(frame, 'pool') and not frame.array.flags.writeable:
+            key = (id(frame.pool), seq, quality)
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] is frame.pool:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry
+        array = np.asarray(frame)
+        ok, encoded = cv2.imencode('.jpg', array, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not ok:
+            raise RuntimeError(f"JPEG encoding of a {array.shape} {array.dtype} frame failed")
+        entry = [getattr(frame, 'pool', None), encoded.tobytes(), None]
+        with self._lock:
+            self.misses += 1
+            if key is None:
+                return entry
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+class Overlay:
+    # Annotation layer drawn over an encoded frame (as SVG) instead of into its pixels.
+    # Colors are BGR tuples like cv2 uses.
+    def __init__(self) -> None:
+        self.items = []
+
+    def circle(self, center:tuple, radius:int, color:tuple=(0, 255, 0), thickness:int=3) -> 'Overlay':
+        self.items.append(('circle', center, radius, color, thickness))
+        return self
+
+    def line(self, pt1:tuple, pt2:tuple, color:tuple=(0, 255, 0), thickness:int=2) -> 'Overlay':
+        self.items.append(('line', pt1, pt2, color, thickness))
+        return self
+
+    def clear(self) -> None:
+        self.items = []
+
+    def draw(self, image:np.ndarray) -> np.ndarray:
+        # rasterize into an image with cv2, for when the pixels are needed
+        for item in self.items:
+            if item[0] == 'circle':
+                cv2.circle(image, item[1], item[2], item[3], item[4])
+            else:
+                cv2.line(image, item[1], item[2], item[3], item[4])
+        return image
+
+    def to_svg(self, width:int, height:int, jpeg_b64:str) -> bytes:
+        parts = [
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" viewBox="0 0 {width} {height}">',
+            f'<image width="{width}" height="{height}" href="data:image/jpeg;base64,{jpeg_b64}"/>'
+        ]
+        for item in self.items:
+            b, g, r = item[3]
+            color = f'rgb({r},{g},{b})'
+            if item[0] == 'circle':
+                (x, y), radius, thickness = item[1], item[2], item[4]
+                parts.append(f'<circle cx="{x}" cy="{y}" r="{radius}" fill="none" stroke="{color}" stroke-width="{thickness}"/>')
+            else:
+                (x1, y1), (x2, y2), thickness = item[1], item[2], item[4]
+                parts.append(f'<line x1="{x1}" y1="{y1}" x2="{x2}" y2="{y2}" stroke="{color}" stroke-width="{thickness}"/>')
+        parts.append('</svg>')
+        return ''.join(parts).encode('utf-8')
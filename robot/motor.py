@@ -2,6 +2,7 @@ from genericpath import isfile
 import traitlets
 from traitlets.config.configurable import Configurable, HasTraits
 from .pca9685 import PCA9685
+from .calibration import LookupTable, cached_table, duty_to_count, duty_to_counts, np
 from typing import Union
 import os
 from pathlib import Path
@@ -13,51 +14,227 @@ class Motor(Configurable):
     # config
     alpha = traitlets.Float(default_value=1.0).tag(config=True)
     beta = traitlets.Float(default_value=0.0).tag(config=True)
+    # optional CalibrationCurve from speed to signed output, replaces alpha*speed+beta when set
+    curve = traitlets.Any(default_value=None)
+    # optional OutputFilter, decides which value changes are written to the PCA9685
+    output_filter = traitlets.Any(default_value=None)
+
+    # lookup table entries over the speed range -1.0 to 1.0
+    table_resolution = 8193
 
     def __init__(self, pca:PCA9685, a:int, b:int):
         self.pca = pca
         self.a = a
         self.b = b
         self.ab_continuous = ((b-a) == 1)
+        self._table = None
+        self._table_freq = None
+
+    def cal_output(self, speed:Union[float,int]) -> float:
+        return self._output_func()(speed)
+
+    def cal_counts(self, speed:Union[float,int]) -> tuple:
+        # (a, b) 12-bit counts, speed outside -1.0 to 1.0 is treated as -1.0 or 1.0
+        if self._table is None or self._table_freq != self.pca.frequency:
+            self.build_table()
+        return self._table(speed)
 
     def cal_ab(self, speed:Union[float,int]) -> list:
-        value = min(max(speed*self.alpha+self.beta, -1.0), 1.0)
-        if value > 0:
-            return [0.0, value]
+        count_a, count_b = self.cal_counts(speed)
+        return [count_a / 4096.0, count_b / 4096.0]
+
+    def build_table(self) -> None:
+        # shared with every motor of the same calibration
+        freq = self.pca.frequency
+        curve = None if self.curve is None else self.curve.key
+        key = ('motor', self.alpha, self.beta, curve, freq, self.table_resolution)
+        self._table = cached_table(key, self._make_table)
+        self._table_freq = freq
+
+    def _make_table(self) -> LookupTable:
+        if np is None:
+            output = self._output_func()
+            def entry(speed):
+                value = output(speed)
+                if value > 0:
+                    return (0, duty_to_count(value))
+                else:
+                    return (duty_to_count(-value), 0)
+            return LookupTable(entry, self.table_resolution)
+        speed = LookupTable.grid(self.table_resolution)
+        if self.curve is None:
+            value = np.clip(speed*self.alpha+self.beta, -1.0, 1.0)
         else:
-            return [-value, 0.0]
-        
+            value = np.clip(self.curve.to_duty(self.curve.evaluate(speed), self.pca.frequency), -1.0, 1.0)
+        forward = value > 0
+        count_a = np.where(forward, 0, duty_to_counts(-value))
+        count_b = np.where(forward, duty_to_counts(value), 0)
+        return LookupTable(None, self.table_resolution, list(zip(count_a.tolist(), count_b.tolist())))
+
+    def _output_func(self):
+        # snapshot of the calibration as a plain function, cheap enough to evaluate for every table entry
+        alpha, beta, curve, freq = self.alpha, self.beta, self.curve, self.pca.frequency
+        if curve is None:
+            return lambda speed: min(max(speed*alpha+beta, -1.0), 1.0)
+        return lambda speed: min(max(curve.to_duty(curve(speed), freq), -1.0), 1.0)
+
+    @traitlets.observe('alpha', 'beta', 'curve')
+    def _observe_calibration(self, change):
+        self._table = None
+
+    @traitlets.observe('output_filter')
+    def _observe_output_filter(self, change):
+        if change['new'] is not None:
+            change['new'].sink = self._write_output
+
+    @traitlets.validate('value')
+    def _validate_value(self, proposal):
+        # the output filter sees every assignment, also unchanged ones, so keepalive and smoothing keep going
+        if self.output_filter is not None:
+            self._apply(proposal['value'])
+        return proposal['value']
+
     @traitlets.observe('value')
     def _observe_value(self, change):
-        pwm_value = self.cal_ab(change['new'])
+        if self.output_filter is None:
+            self._write_output(change['new'])
+
+    def rewrite(self, speed:Union[float,int,None]=None) -> None:
+        # write speed (default: the current value) even when the trait is unchanged, for outputs changed behind
+        # its back like a watchdog stop; the output filter starts over
+        if self.output_filter is not None:
+            self.output_filter.reset()
+        if speed is None or speed == self.value:
+            self._apply(self.value)
+        else:
+            self.value = speed
+
+    def _apply(self, speed:Union[float,int]) -> None:
+        if self.output_filter is not None:
+            speed = self.output_filter(speed)
+            if speed is None:
+                return
+        self._write_output(speed)
+
+    def _write_output(self, speed:Union[float,int]) -> None:
+        counts = self.cal_counts(speed)
         if self.ab_continuous:
-            self.pca[self.a:self.b+1] = pwm_value
+            self.pca.set_counts(self.a, counts)
         else:
-            self.pca[self.a, self.b] = pwm_value
+            self.pca.set_count(self.a, counts[0])
+            self.pca.set_count(self.b, counts[1])
 
 class Servo(HasTraits):
     value = traitlets.Float()
 
+    alpha0 = traitlets.Float()
+    alpha1 = traitlets.Float()
+    beta = traitlets.Float()
+    min_duty_cycle = traitlets.Float()
+    center_duty_cycle = traitlets.Float()
+    max_duty_cycle = traitlets.Float()
+    # optional CalibrationCurve from position to duty cycle (or pulse width), replaces alpha0/alpha1/beta when set
+    curve = traitlets.Any(default_value=None)
+    # optional OutputFilter, decides which value changes are written to the PCA9685
+    output_filter = traitlets.Any(default_value=None)
+
+    # lookup table entries over the position range -1.0 to 1.0
+    table_resolution = 8193
+
     def __init__(self, pca:PCA9685, channel:int, min_width:int=1000, center_width:int=1500, max_width:int=2000):
         # min_width and max_width unit in microsecond
         self.pca = pca
         self.channel = channel
+        self._table = None
+        self._table_freq = None
         self._cal_alpha_beta(pca.frequency, min_width, center_width, max_width)
 
+    def cal_output(self, pos:Union[float,int]) -> float:
+        return self._output_func()(pos)
+
+    def cal_count(self, pos:Union[float,int]) -> int:
+        # 12-bit count, pos outside -1.0 to 1.0 is treated as -1.0 or 1.0
+        if self._table is None or self._table_freq != self.pca.frequency:
+            self.build_table()
+        return self._table(pos)
+
     def cal_duty_cycle(self, pos:Union[float,int]) -> float:
-        if pos > 0:
-            return min(max(pos*self.alpha0+self.beta, self.min_duty_cycle), self.max_duty_cycle)
+        return self.cal_count(pos) / 4096.0
+
+    def build_table(self) -> None:
+        # shared with every servo of the same calibration
+        freq = self.pca.frequency
+        curve = None if self.curve is None else self.curve.key
+        key = ('servo', self.alpha0, self.alpha1, self.beta, self.min_duty_cycle, self.max_duty_cycle, curve, freq,
+               self.table_resolution)
+        self._table = cached_table(key, self._make_table)
+        self._table_freq = freq
+
+    def _make_table(self) -> LookupTable:
+        if np is None:
+            output = self._output_func()
+            return LookupTable(lambda pos: duty_to_count(output(pos)), self.table_resolution)
+        pos = LookupTable.grid(self.table_resolution)
+        if self.curve is None:
+            duty = pos*np.where(pos > 0, self.alpha0, self.alpha1)+self.beta
         else:
-            return min(max(pos*self.alpha1+self.beta, self.min_duty_cycle), self.max_duty_cycle)
-    
+            duty = self.curve.to_duty(self.curve.evaluate(pos), self.pca.frequency)
+        duty = np.minimum(np.maximum(duty, self.min_duty_cycle), self.max_duty_cycle)
+        return LookupTable(None, self.table_resolution, duty_to_counts(duty).tolist())
+
+    def _output_func(self):
+        # snapshot of the calibration as a plain function, cheap enough to evaluate for every table entry
+        alpha0, alpha1, beta, curve, freq = self.alpha0, self.alpha1, self.beta, self.curve, self.pca.frequency
+        min_duty, max_duty = self.min_duty_cycle, self.max_duty_cycle
+        if curve is None:
+            return lambda pos: min(max(pos*(alpha0 if pos > 0 else alpha1)+beta, min_duty), max_duty)
+        return lambda pos: min(max(curve.to_duty(curve(pos), freq), min_duty), max_duty)
+
+    @traitlets.observe('alpha0', 'alpha1', 'beta', 'min_duty_cycle', 'max_duty_cycle', 'curve')
+    def _observe_calibration(self, change):
+        self._table = None
+
     def reverse_output(self):
         temp = self.alpha0
         self.alpha0 = -self.alpha1
         self.alpha1 = -temp
-        
+
+    @traitlets.observe('output_filter')
+    def _observe_output_filter(self, change):
+        if change['new'] is not None:
+            change['new'].sink = self._write_output
+
+    @traitlets.validate('value')
+    def _validate_value(self, proposal):
+        # the output filter sees every assignment, also unchanged ones, so keepalive and smoothing keep going
+        if self.output_filter is not None:
+            self._apply(proposal['value'])
+        return proposal['value']
+
     @traitlets.observe('value')
     def _observe_value(self, change):
-        self.pca[self.channel] = self.cal_duty_cycle(change['new'])
+        if self.output_filter is None:
+            self._write_output(change['new'])
+
+    def rewrite(self, pos:Union[float,int,None]=None) -> None:
+        # write pos (default: the current value) even when the trait is unchanged, for outputs changed behind
+        # its back like a watchdog stop; the output filter starts over
+        if self.output_filter is not None:
+            self.output_filter.reset()
+        if pos is None or pos == self.value:
+            self._apply(self.value)
+        else:
+            self.value = pos
+
+    def _apply(self, pos:Union[float,int]) -> None:
+        if self.output_filter is not None:
+            pos = self.output_filter(pos)
+            if pos is None:
+                return
+        self._write_output(pos)
+
+    def _write_output(self, pos:Union[float,int]) -> None:
+        self.pca.set_count(self.channel, self.cal_count(pos))
 
     def _cal_alpha_beta(self, freq:int, min_width:int, center_width:int, max_width:int):
         # Get the period in microsecond from freq
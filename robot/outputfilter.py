@@ -0,0 +1,157 @@
+import threading
+import time
+from typing import Callable, Union
+
+class OutputFilter:
+    # Write suppression for one actuator, applied to the normalized command before calibration:
+    #   ema         smoothing factor in (0, 1], the filtered command moves this fraction towards each new one;
+    #               while a held command is still being approached, a timer keeps stepping towards it every
+    #               settle_interval seconds and writes it exactly in the end
+    #   deadband    changes smaller than this from the last sent command are not written
+    #   hysteresis  extra change needed when the command turns back the other way, stops chatter between
+    #               two neighbouring values
+    #   max_rate    writes per second at most, for commands that pass the deadband; a command held back by the
+    #               cap is written by a timer when the interval is over, so the last command always reaches
+    #               the PCA9685
+    #   keepalive   seconds after which any command is written again even if unchanged, so outputs that
+    #               were changed behind the filter's back (e.g. a watchdog stop) are restored; keep it
+    #               below the watchdog timeout
+    # The first command and every stop (0.0) go straight through, without smoothing or rate cap.
+    # Timer writes go to `sink`, so held and smoothed commands only settle when the filter is attached.
+
+    # distance at which smoothing snaps onto the command
+    settle_epsilon = 1e-4
+
+    def __init__(self, deadband:float=0.0, hysteresis:float=0.0, ema:Union[float,None]=None,
+                 max_rate:Union[float,None]=None, keepalive:Union[float,None]=0.2, settle_interval:float=0.02) -> None:
+        if deadband < 0 or hysteresis < 0:
+            raise ValueError(f"deadband {deadband} and hysteresis {hysteresis} should not be negative")
+        if ema is not None and not (0.0 < ema <= 1.0):
+            raise ValueError(f"ema factor {ema} out of range, should be within 0.0 (exclusive) to 1.0")
+        if max_rate is not None and max_rate <= 0:
+            raise ValueError(f"max rate {max_rate} should be positive")
+        self.deadband = deadband
+        self.hysteresis = hysteresis
+        self.ema = ema
+        self.max_rate = max_rate
+        self.keepalive = keepalive
+        self.settle_interval = settle_interval
+        # set by the Motor/Servo the filter is attached to, writes a command held back by the rate cap
+        self.sink = None
+        self.sent = 0
+        self.suppressed = 0
+        self.last = None
+        self._last_time = 0.0
+        self._smoothed = None
+        self._target = None
+        self._accepted = None
+        self._direction = 0
+        self._pending = None
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def __call__(self, value:float) -> Union[float,None]:
+        # the command to write, or None when the write is suppressed
+        now = time.monotonic()
+        with self._lock:
+            self._target = value
+            if value == 0.0 or self._smoothed is None or self.ema is None:
+                self._smoothed = value
+            else:
+                self._smoothed = self._smooth(value)
+            value = self._smoothed
+            if self.last is None or (value == 0.0 and self.last != 0.0):
+                return self._send(value, now)
+            if self.keepalive is None or now - self._last_time < self.keepalive:
+                # deadband and hysteresis first, only a command that would be written can be held by the cap
+                delta = value - self.last
+                threshold = self.deadband
+                if self._direction and (delta > 0) != (self._direction > 0):
+                    threshold += self.hysteresis
+                if delta == 0.0 or abs(delta) < threshold:
+                    # back within the deadband, a command still held by the cap is no longer needed
+                    self._pending = None
+                    self.suppressed += 1
+                    if abs(self._target - self.last) >= threshold:
+                        # only the smoothing step is small, the command itself is a real change
+                        self._accepted = self._target
+                    self._settle(now)
+                    return None
+            if self.max_rate is not None and now - self._last_time < 1.0 / self.max_rate:
+                self._hold(value, now)
+                return None
+            return self._send(value, now)
+
+    def reset(self) -> None:
+        # forget the last sent command, the next one is written whatever it is
+        with self._lock:
+            self.last = None
+            self._smoothed = None
+            self._target = None
+            self._accepted = None
+            self._direction = 0
+            self._pending = None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def stats(self) -> dict:
+        total = self.sent + self.suppressed
+        return {'sent': self.sent, 'suppressed': self.suppressed, 'suppressed_ratio': self.suppressed / total if total else 0.0}
+
+    def _send(self, value:float, now:float) -> float:
+        if value != self.last and self.last is not None:
+            self._direction = 1 if value > self.last else -1
+        self.last = value
+        self._last_time = now
+        self._pending = None
+        self.sent += 1
+        self._accepted = self._target
+        self._settle(now)
+        return value
+
+    def _smooth(self, target:float) -> float:
+        value = self._smoothed + self.ema * (target - self._smoothed)
+        return target if abs(target - value) < self.settle_epsilon else value
+
+    def _settle(self, now:float) -> None:
+        # keep approaching a command that smoothing hasn't reached yet; a command that was itself within the
+        # deadband (jitter) is never accepted and not approached
+        if self._timer is not None or self.sink is None or not self._settling():
+            return
+        delay = self.settle_interval
+        if self.max_rate is not None:
+            delay = max(delay, self._last_time + 1.0 / self.max_rate - now)
+        self._timer = threading.Timer(delay, self._flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _hold(self, value:float, now:float) -> None:
+        self.suppressed += 1
+        if value == self.last:
+            self._pending = None
+            return
+        self._pending = value
+        if self._timer is None and self.sink is not None:
+            self._timer = threading.Timer(self._last_time + 1.0 / self.max_rate - now, self._flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _settling(self) -> bool:
+        return self._target is not None and self._target == self._accepted and self._smoothed != self._target
+
+    def _flush(self) -> None:
+        with self._lock:
+            self._timer = None
+            value = self._pending
+            if value is not None:
+                self.suppressed -= 1
+            elif self._settling():
+                # smoothing step towards the held command
+                value = self._smoothed = self._smooth(self._target)
+            else:
+                return
+            self._send(value, time.monotonic())
+            sink = self.sink
+        if sink is not None:
+            sink(value)
@@ -1,6 +1,42 @@
-from smbus import SMBus
 from typing import Union
+import threading
 import time
+from . import trace
+try:
+    # smbus2 adds raw I2C transactions (i2c_rdwr), python-smbus only has SMBus transfers
+    from smbus2 import SMBus, i2c_msg
+except ImportError:
+    i2c_msg = None
+    try:
+        from smbus import SMBus
+    except ImportError:
+        SMBus = None
+
+class _Batch:
+    # context manager returned by PCA9685.batch()
+    __slots__ = ('pca', 'writes')
+
+    def __init__(self, pca:'PCA9685') -> None:
+        self.pca = pca
+        self.writes = None
+
+    def __enter__(self) -> 'PCA9685':
+        pca = self.pca
+        if getattr(pca._local, 'batch', None) is None:
+            self.writes = pca._local.batch = []
+            with pca._batching_lock:
+                pca._batching += 1
+        return pca
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self.writes is not None:
+            pca = self.pca
+            pca._local.batch = None
+            with pca._batching_lock:
+                pca._batching -= 1
+            # a block that raised sends nothing, half a synchronized command is worse than none
+            if exc_type is None:
+                pca._write_batch(self.writes)
 
 class PCA9685:
     # register address
@@ -37,34 +73,150 @@ class PCA9685:
     # register LEDn_ON_H LEDn_OFF_H mask
     LEDn_H_FULL_MASK  = 0x10
     LEDn_H_COUNT_MASK = 0x0F
+    # SMBus block transfers carry at most 32 bytes, 8 channels
+    BLOCK_BYTES = 32
+    BLOCK_CHANNELS = 8
+    # last LED register, auto increment wraps from here to MODE1
+    LED15_OFF_H = 0x45
+    # i2c-dev functionality bit for plain I2C transfers
+    I2C_FUNC_I2C = 0x00000001
+    # most messages one I2C_RDWR ioctl takes
+    RDWR_MAX_MSGS = 42
+    # register values for every 12-bit count, filled on first use
+    _count_regs = None
     
-    def __init__(self, bus=1, i2c_addr=0x40, ref_freq=25000000) -> None:
-        self.bus = SMBus(bus)
+    def __init__(self, bus=1, i2c_addr=0x40, ref_freq=25000000, raw_i2c=None, sync_outputs=False) -> None:
+        # bus can be an adapter number or any SMBus-like object (e.g. PCA9685Emulator)
+        # raw_i2c: use i2c_rdwr transactions for transfers over 32 bytes, None to use them when the bus
+        #   and adapter support plain I2C; otherwise long transfers are split into 32-byte block transfers
+        # sync_outputs: reset() sets MODE2 so outputs change on the I2C STOP, then everything written in one
+        #   transaction (one write, or a batch() with raw I2C) takes effect in the same PWM cycle
+        if isinstance(bus, int):
+            if SMBus is None:
+                raise RuntimeError("smbus is required to open I2C adapter {b}".format(b=bus))
+            self.bus = SMBus(bus)
+            self.bus_id = bus
+        else:
+            self.bus = bus
+            self.bus_id = id(bus)
         self.address = i2c_addr
+        self._i2c_msg = getattr(self.bus, 'i2c_msg', i2c_msg)
+        if raw_i2c is None:
+            funcs = getattr(self.bus, 'funcs', self.I2C_FUNC_I2C)
+            raw_i2c = self._i2c_msg is not None and hasattr(self.bus, 'i2c_rdwr') and bool(funcs & self.I2C_FUNC_I2C)
+        self.raw_i2c = raw_i2c
+        # channels one write can carry, all 16 with raw I2C
+        self.block_channels = 16 if raw_i2c else self.BLOCK_CHANNELS
         self.ref_freq = ref_freq
+        self.sync_outputs = sync_outputs
         self.write_buf = []
         self._frequency = 0
+        if PCA9685._count_regs is None:
+            PCA9685._count_regs = [self._cal_on_off_count(c) for c in range(4097)]
+        # LEDn_ON offset and register table of each channel, see set_phase
+        self.phases = [0] * 16
+        self._channel_regs = [self._count_regs] * 16
+        # writes collected by batch(), per thread so a watchdog stop never joins a controller batch;
+        # _batching counts open batches so plain writes skip the thread local lookup; it is changed under
+        # _batching_lock and read without it, a thread only needs to see its own batch counted
+        self._local = threading.local()
+        self._batching = 0
+        self._batching_lock = threading.Lock()
         self.reset()
         
     def reset(self) -> None:
         self._write_reg(self.MODE1, [0x00])
+        if self.sync_outputs:
+            self.configure_mode2(change_on_ack=False)
+
+    def configure_mode2(self, invert:bool=False, change_on_ack:bool=False, totem_pole:bool=True, outne:int=0) -> None:
+        # invert: INVRT, change_on_ack: OCH (False changes outputs on STOP), totem_pole: OUTDRV (False for
+        # open drain), outne: OUTNE output state while OE is high; the defaults are the power-on state
+        value = (outne & self.MODE2_OUTNE_MASK)
+        if invert:
+            value |= self.MODE2_INVRT_MASK
+        if change_on_ack:
+            value |= self.MODE2_OCH_MASK
+        if totem_pole:
+            value |= self.MODE2_OUTDRV_MASK
+        self._write_reg(self.MODE2, [value])
+
+    @property
+    def mode2(self) -> int:
+        return self._read_reg(self.MODE2, 1)[0]
+
+    def set_phase(self, channel, offset) -> None:
+        # delay the channel's pulse by offset counts (LEDn_ON), spreading switching edges over the period;
+        # takes effect on the channel's next write
+        self._get_channel_reg_addr(channel)
+        offset = int(offset) % 4096
+        self.phases[channel] = offset
+        if offset == 0:
+            self._channel_regs[channel] = self._count_regs
+        else:
+            self._channel_regs[channel] = [self._cal_on_off_count(c, offset) for c in range(4097)]
+
+    def stagger(self, channels=range(16), spacing:Union[int,None]=None) -> None:
+        # evenly spaced phase offsets over the given channels, e.g. stagger((0, 1, 2, 3)) for a JetBot
+        channels = list(channels)
+        if spacing is None:
+            spacing = 4096 // len(channels)
+        for i, channel in enumerate(channels):
+            self.set_phase(channel, i * spacing)
+
+    def batch(self) -> _Batch:
+        # with pca.batch(): ... Writes inside the block are sent on exit as one combined I2C transaction
+        # (repeated starts and a single STOP) when raw I2C is available, so with sync_outputs they latch in
+        # the same PWM cycle. Without raw I2C they are still merged where the channels are consecutive.
+        # Reads are not deferred, and a block that raises writes nothing.
+        return _Batch(self)
 
     def set_duty_cycle(self, channel, duty_cycle) -> None:
         channel_reg = self._get_channel_reg_addr(channel)
-        reg_value = self._cal_on_off_value(duty_cycle)
+        reg_value = self._cal_on_off_value(duty_cycle, channel)
         self._write_reg(channel_reg, reg_value)
 
+    def set_count(self, channel, count) -> None:
+        # count is the 12-bit on time, 0 for full off and 4096 for full on
+        channel_reg = self._get_channel_reg_addr(channel)
+        self._write_reg(channel_reg, self._channel_regs[channel][count])
+
+    def set_counts(self, channel, counts) -> None:
+        # write counts to consecutive channels starting from channel in one block write
+        self._get_channel_reg_addr(channel + len(counts) - 1)
+        reg_value = []
+        for i, c in enumerate(counts):
+            reg_value += self._channel_regs[channel + i][c]
+        self._write_reg(self._get_channel_reg_addr(channel), reg_value)
+
+    def counts_blocks(self, channel_counts:dict) -> list:
+        # Turn {channel: count} into (reg, data) block writes, one per run of consecutive channels
+        blocks = []
+        last = None
+        for channel in sorted(channel_counts):
+            regs = self._channel_regs[channel][channel_counts[channel]]
+            if last is not None and channel == last + 1 and len(blocks[-1][1]) < self.block_channels * 4:
+                blocks[-1][1].extend(regs)
+            else:
+                blocks.append((self._get_channel_reg_addr(channel), list(regs)))
+            last = channel
+        return blocks
+
+    def write_blocks(self, blocks:list) -> None:
+        with self.batch():
+            for reg, data in blocks:
+                self._write_reg(reg, data)
+
     def get_duty_cycle(self, channel) -> float:
         channel_reg = self._get_channel_reg_addr(channel)
         reg_value = self._read_reg(channel_reg, 4)
-        if reg_value[1] & self.LEDn_H_FULL_MASK:
-            return 1.0
-        elif reg_value[3] & self.LEDn_H_FULL_MASK:
-            return 0.0
-        else:
-            on = reg_value[0] | (reg_value[1] << 8)
-            off = reg_value[2] | (reg_value[3] << 8)
-            return (off-on)/4096.0
+        return self._decode_duty_cycle(reg_value)
+
+    def get_duty_cycles(self, channel, count) -> list:
+        # duty cycles of count consecutive channels starting from channel, read in one transfer when possible
+        self._get_channel_reg_addr(channel + count - 1)
+        reg_value = self._read_reg(self._get_channel_reg_addr(channel), count * 4)
+        return [self._decode_duty_cycle(reg_value[i:i+4]) for i in range(0, count * 4, 4)]
         
     @property
     def frequency(self) -> int:
@@ -82,17 +234,24 @@ class PCA9685:
 
     def __setitem__(self, key, value) -> None:
         if isinstance(key, slice):
-            channel_reg = self._get_channel_reg_addr(key.start)
-            reg_value = []
+            channels = range(*key.indices(16))
             if isinstance(value, float) or isinstance(value, int):
-                for i in range(key.start, key.stop):
-                    reg_value += self._cal_on_off_value(value)
+                values = [value] * len(channels)
             elif isinstance(value, list) or isinstance(value, tuple):
-                for i in range(key.start, key.stop):
-                    reg_value += self._cal_on_off_value(value[i])
+                if len(value) != len(channels):
+                    raise ValueError(f"{len(value)} duty cycles for {len(channels)} channels")
+                values = value
             else:
                 raise TypeError("{c} not supported to set duty cycle".format(c=type(value)))
-            self._write_reg(channel_reg, reg_value)
+            if channels.step != 1:
+                for k, v in zip(channels, values):
+                    self.set_duty_cycle(k, v)
+                return
+            reg_value = []
+            for k, v in zip(channels, values):
+                reg_value += self._cal_on_off_value(v, k)
+            # one transaction for all of them with raw I2C, otherwise 32-byte chunks
+            self._write_reg(self._get_channel_reg_addr(channels.start), reg_value)
         elif isinstance(key, tuple):
             if isinstance(value, float) or isinstance(value, int):
                 for k in key:
@@ -112,9 +271,11 @@ class PCA9685:
 
     def __getitem__(self, key) -> Union[list,float]:
         if isinstance(key, slice):
-            res = []
-            for i in range(key.start, key.stop):
-                res.append(self.get_duty_cycle(i))
+            channels = range(*key.indices(16))
+            if channels.step == 1:
+                res = self.get_duty_cycles(channels.start, len(channels)) if channels else []
+            else:
+                res = [self.get_duty_cycle(i) for i in channels]
         elif isinstance(key, tuple):
             res = []
             for k in key:
@@ -126,10 +287,70 @@ class PCA9685:
         return res
 
     def _write_reg(self, reg, data) -> None:
-        self.bus.write_i2c_block_data(self.address, reg, data)
+        writes = getattr(self._local, 'batch', None) if self._batching else None
+        if writes is not None:
+            # merge with the previous write when it ends where this one starts
+            if writes and reg <= self.LED15_OFF_H and writes[-1][0] + len(writes[-1][1]) == reg \
+                    and len(writes[-1][1]) + len(data) <= self.block_channels * 4:
+                writes[-1][1].extend(data)
+            else:
+                writes.append((reg, list(data)))
+            return
+        if trace.enabled:
+            with trace.span('pca9685.write', reg=reg, bytes=len(data)):
+                self._write(reg, data)
+        else:
+            self._write(reg, data)
         
     def _read_reg(self, reg, length) -> list:
-        return self.bus.read_i2c_block_data(self.address, reg, length) 
+        if trace.enabled:
+            with trace.span('pca9685.read', reg=reg, bytes=length):
+                return self._read(reg, length)
+        return self._read(reg, length)
+
+    def _write_batch(self, writes:list) -> None:
+        if not writes:
+            return
+        if len(writes) == 1 or not self.raw_i2c:
+            for reg, data in writes:
+                self._write_reg(reg, data)
+            return
+        msgs = [self._i2c_msg.write(self.address, [reg] + data) for reg, data in writes]
+        for i in range(0, len(msgs), self.RDWR_MAX_MSGS):
+            if trace.enabled:
+                with trace.span('pca9685.batch', msgs=len(msgs[i:i+self.RDWR_MAX_MSGS])):
+                    self.bus.i2c_rdwr(*msgs[i:i+self.RDWR_MAX_MSGS])
+            else:
+                self.bus.i2c_rdwr(*msgs[i:i+self.RDWR_MAX_MSGS])
+
+    def _write(self, reg, data) -> None:
+        # up to 32 bytes is one SMBus block write, the same bytes on the wire as a raw I2C write
+        if len(data) <= self.BLOCK_BYTES:
+            self.bus.write_i2c_block_data(self.address, reg, data)
+        elif self.raw_i2c:
+            self.bus.i2c_rdwr(self._i2c_msg.write(self.address, [reg] + list(data)))
+        else:
+            for i in range(0, len(data), self.BLOCK_BYTES):
+                self.bus.write_i2c_block_data(self.address, self._reg_offset(reg, i), data[i:i+self.BLOCK_BYTES])
+
+    def _read(self, reg, length) -> list:
+        if length <= self.BLOCK_BYTES:
+            return self.bus.read_i2c_block_data(self.address, reg, length)
+        if self.raw_i2c:
+            # register pointer write and read joined by a repeated start
+            read = self._i2c_msg.read(self.address, length)
+            self.bus.i2c_rdwr(self._i2c_msg.write(self.address, [reg]), read)
+            return list(read)
+        res = []
+        for i in range(0, length, self.BLOCK_BYTES):
+            res += self.bus.read_i2c_block_data(self.address, self._reg_offset(reg, i), min(self.BLOCK_BYTES, length - i))
+        return res
+
+    def _reg_offset(self, reg, offset) -> int:
+        # register the auto increment reaches after offset bytes, wrapping after LED15_OFF_H like the chip
+        if reg <= self.LED15_OFF_H:
+            return (reg + offset) % (self.LED15_OFF_H + 1)
+        return (reg + offset) & 0xFF
     
     def _get_channel_reg_addr(self, channel) -> int:
         # Return LEDx_ON_L reg addr
@@ -137,14 +358,31 @@ class PCA9685:
             raise RuntimeError(f"PCA9685 had only 16 channel, can't access channel {channel}")
         return self.LED0_ON_L + channel * 4
     
-    def _cal_on_off_value(self, duty_cycle) -> list:
+    def _decode_duty_cycle(self, reg_value) -> float:
+        if reg_value[1] & self.LEDn_H_FULL_MASK:
+            return 1.0
+        elif reg_value[3] & self.LEDn_H_FULL_MASK:
+            return 0.0
+        else:
+            on = reg_value[0] | ((reg_value[1] & self.LEDn_H_COUNT_MASK) << 8)
+            off = reg_value[2] | ((reg_value[3] & self.LEDn_H_COUNT_MASK) << 8)
+            # a phase offset can put OFF before ON, the pulse then wraps around the period
+            return ((off-on) % 4096)/4096.0
+
+    def _cal_on_off_value(self, duty_cycle, channel=None) -> list:
         int_cycle = int(duty_cycle*4096)
         if not(0 <= duty_cycle <= 4096):
             raise ValueError(f"Duty cycle value {duty_cycle} out of range, should be within 0.0 to 1.0")
-        elif int_cycle == 0:
+        if channel is None:
+            return self._cal_on_off_count(int_cycle)
+        return self._cal_on_off_count(int_cycle, self.phases[channel])
+
+    def _cal_on_off_count(self, int_cycle, phase=0) -> list:
+        if int_cycle == 0:
             return [0x00, 0x00, 0x00, self.LEDn_H_FULL_MASK]    # full off
         elif int_cycle == 4096:
             # return [0x00, self.LEDn_H_FULL_MASK, 0x00, 0x00]    # some problem with stemplus firmware, cant use full on mask
-            return [0x00, 0x00, 0xFF, 0x0F]    # full on
+            off = (phase + 4095) % 4096    # full on
         else:
-            return [0x00, 0x00, int_cycle&0xFF, (int_cycle>>8)&0xF]
+            off = (phase + int_cycle) % 4096
+        return [phase&0xFF, (phase>>8)&0xF, off&0xFF, (off>>8)&0xF]
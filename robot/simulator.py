@@ -0,0 +1,264 @@
+import time
+from typing import Callable, Union
+import numpy as np
+from .config import MemoryConfigStore, JETBOT_SCHEMA, JETRACER_SCHEMA
+from .emulator import PCA9685Emulator
+from .jetbot import JetBot
+from .jetracer import JetRacer
+
+# Headless kinematics simulation behind the PCA9685 interface. The robots are ordinary JetBot/JetRacer
+# objects on simulated buses, so control code runs unchanged; each step reads back the registers it wrote,
+# undoes the Motor/Servo calibration and integrates the poses of every robot at once. A channel that is
+# full off (never written, or switched off) is no pulse: the motor stands still and the servo stays centered.
+# Calibrations live in a MemoryConfigStore per simulator, never in the calibration files under ~, with
+# the robots named by index (sim0, sim1, ... or name + index) so each keeps its own.
+#
+#   sim = JetRacerSim(1000, dt=0.02)
+#   sim.reset([0.0, 0.5, 0.0])
+#   gains = np.linspace(0.2, 2.0, 1000)
+#   def control(sim):
+#       for car, gain, (x, y, heading) in zip(sim.robots, gains, sim.pose):
+#           car.throttle = 0.2
+#           car.steering = -(y + 0.2 * heading) * gain    # hold the line y = 0
+#   sim.run(10.0, control)
+#   sim.poses()    # (steps, 1000, 3) x, y, heading
+
+class SimBus:
+    # Register files of many simulated PCA9685 chips in one array, one row per chip
+    LED0_ON_L = 0x06
+
+    def __init__(self, chips:int, i2c_addr:int=0x40) -> None:
+        self.address = i2c_addr
+        self.regs = np.zeros((chips, 256), dtype=np.uint8)
+        # power-on state, as PCA9685Emulator
+        self.regs[:, PCA9685Emulator.MODE1] = 0x11
+        self.regs[:, PCA9685Emulator.MODE2] = 0x04
+        self.regs[:, self.LED0_ON_L + 3:self.LED0_ON_L + 64:4] = 0x10
+        self.regs[:, PCA9685Emulator.PRESCALE] = 0x1E
+
+    def __len__(self) -> int:
+        return self.regs.shape[0]
+
+    def device(self, index:int) -> 'SimDevice':
+        return SimDevice(self, index)
+
+    def counts(self) -> np.ndarray:
+        # (chips, 16) programmed OFF-ON counts, as PCA9685Emulator.duty_counts for every channel
+        r = self.regs[:, self.LED0_ON_L:self.LED0_ON_L + 64].reshape(-1, 16, 4).astype(np.intp)
+        on = r[..., 0] | ((r[..., 1] & 0x0F) << 8)
+        off = r[..., 2] | ((r[..., 3] & 0x0F) << 8)
+        counts = (off - on) % 4096
+        counts[(r[..., 1] & 0x10) != 0] = 4096
+        counts[(r[..., 3] & 0x10) != 0] = 0
+        return counts
+
+    def full_off(self) -> np.ndarray:
+        # (chips, 16) True where a channel outputs no pulse at all
+        r = self.regs[:, self.LED0_ON_L:self.LED0_ON_L + 64].reshape(-1, 16, 4)
+        return ((r[..., 3] & 0x10) != 0) | (self.counts() == 0)
+
+class SimDevice(PCA9685Emulator):
+    # One chip of a SimBus, usable as PCA9685(bus=sim_bus.device(i))
+    def __init__(self, bus:SimBus, index:int) -> None:
+        super().__init__(bus.address)
+        self.regs = bus.regs[index]
+
+    def duty_counts(self, channel) -> int:
+        r = bytes(self.regs[self.LED0_ON_L + channel*4:self.LED0_ON_L + channel*4 + 4])
+        if r[3] & 0x10:
+            return 0
+        if r[1] & 0x10:
+            return 4096
+        return ((r[2] | ((r[3] & 0x0F) << 8)) - (r[0] | ((r[1] & 0x0F) << 8))) % 4096
+
+    def _store(self, reg, data) -> None:
+        # LED block writes land in one slice, anything that could wrap or skip AI goes byte by byte
+        if len(data) > 1 and self.regs[self.MODE1] & self.MODE1_AI_MASK and reg + len(data) <= 0x46:
+            self.regs[reg:reg + len(data)] = data
+        else:
+            super()._store(reg, data)
+
+    def _load(self, reg, length) -> list:
+        return [int(v) for v in super()._load(reg, length)]
+
+def _invert(func:Callable, resolution:int=2049) -> Callable:
+    # numeric inverse of a monotonic calibration output, for robots with a custom curve
+    x = np.linspace(-1.0, 1.0, resolution)
+    y = np.array([func(v) for v in x])
+    order = np.argsort(y, kind='stable')
+    return lambda v: float(np.interp(v, y[order], x[order]))
+
+class _Simulator:
+    # fixed step integration, the pose log keeps every log_every-th step
+    def __init__(self, robots:list, bus:SimBus, dt:float, log_every:int) -> None:
+        self.robots = robots
+        self.bus = bus
+        self.dt = dt
+        self.log_every = log_every
+        self.time = 0.0
+        self.steps = 0
+        self.pose = np.zeros((len(robots), 3))
+        self.wall_time = 0.0
+        self._times = []
+        self._poses = []
+        self._dirty = True
+
+    def __len__(self) -> int:
+        return len(self.robots)
+
+    def reset(self, pose:Union[np.ndarray,None]=None) -> None:
+        # pose: (N, 3) x, y, heading or one pose for every robot
+        self.pose[:] = 0.0 if pose is None else pose
+        self.time = 0.0
+        self.steps = 0
+        self.wall_time = 0.0
+        self._times = []
+        self._poses = []
+
+    def step(self, steps:int=1) -> np.ndarray:
+        st = time.perf_counter()
+        velocity = self._velocity()
+        for _ in range(steps):
+            self._integrate(velocity)
+            self.time += self.dt
+            self.steps += 1
+            if self.log_every and self.steps % self.log_every == 0:
+                self._times.append(self.time)
+                self._poses.append(self.pose.copy())
+        self.wall_time += time.perf_counter() - st
+        return self.pose
+
+    def run(self, duration:float, controller:Union[Callable,None]=None) -> np.ndarray:
+        # controller(sim) is called before every step, like a camera callback once per frame
+        for _ in range(int(round(duration / self.dt))):
+            if controller is not None:
+                st = time.perf_counter()
+                controller(self)
+                self.wall_time += time.perf_counter() - st
+            self.step()
+        return self.pose
+
+    @property
+    def realtime_factor(self) -> float:
+        return self.time / self.wall_time if self.wall_time else 0.0
+
+    def times(self) -> np.ndarray:
+        return np.array(self._times)
+
+    def poses(self) -> np.ndarray:
+        # (logged steps, N, 3)
+        return np.array(self._poses).reshape(-1, len(self.robots), 3)
+
+    def save_log(self, path:str) -> None:
+        np.savez_compressed(path, time=self.times(), pose=self.poses())
+
+    def _mark_dirty(self, change) -> None:
+        self._dirty = True
+
+    def _velocity(self) -> tuple:
+        raise NotImplementedError
+
+    def _integrate(self, velocity:tuple) -> None:
+        # velocity: (forward speed, yaw rate) per robot, exact arc integration over one step
+        v, w = velocity
+        x, y, theta = self.pose[:, 0], self.pose[:, 1], self.pose[:, 2]
+        dtheta = w * self.dt
+        straight = np.abs(dtheta) < 1e-9
+        with np.errstate(divide='ignore', invalid='ignore'):
+            r = np.where(straight, 0.0, v / w)
+            dx = np.where(straight, v * self.dt * np.cos(theta), r * (np.sin(theta + dtheta) - np.sin(theta)))
+            dy = np.where(straight, v * self.dt * np.sin(theta), r * (np.cos(theta) - np.cos(theta + dtheta)))
+        x += dx
+        y += dy
+        theta += dtheta
+        np.arctan2(np.sin(theta), np.cos(theta), out=theta)
+
+class JetBotSim(_Simulator):
+    # Differential drive. A motor output at full duty turns its wheel at max_wheel_speed (m/s), the
+    # command the output came from is recovered through the motor's calibration.
+    def __init__(self, count:int=1, dt:float=0.02, wheel_base:float=0.12, max_wheel_speed:float=0.5,
+                 log_every:int=1, **robot_kwargs) -> None:
+        bus = SimBus(count)
+        robot_kwargs.setdefault('conf_store', MemoryConfigStore(JETBOT_SCHEMA))
+        name = robot_kwargs.pop('name', 'sim')
+        robots = [JetBot(bus=bus.device(i), name=f'{name}{i}', **robot_kwargs) for i in range(count)]
+        super().__init__(robots, bus, dt, log_every)
+        self.wheel_base = wheel_base
+        self.max_wheel_speed = max_wheel_speed
+        self.motors = [m for r in robots for m in (r.left_motor, r.right_motor)]
+        for m in self.motors:
+            m.observe(self._mark_dirty, names=['alpha', 'beta', 'curve'])
+
+    def wheel_speeds(self) -> np.ndarray:
+        # (N, 2) left and right wheel speed in m/s
+        if self._dirty:
+            self._refresh()
+        counts = self.bus.counts()
+        rows = np.repeat(np.arange(len(self.robots)), 2)
+        value = (counts[rows, self._b] - counts[rows, self._a]) / 4096.0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            speed = np.where(self._alpha != 0, (value - self._beta) / self._alpha, 0.0)
+        for i, inverse in self._curved.items():
+            speed[i] = inverse(value[i])
+        off = self.bus.full_off()
+        speed[off[rows, self._a] & off[rows, self._b]] = 0.0
+        return (np.clip(speed, -1.0, 1.0) * self.max_wheel_speed).reshape(-1, 2)
+
+    def _refresh(self) -> None:
+        self._a = np.array([m.a for m in self.motors])
+        self._b = np.array([m.b for m in self.motors])
+        self._alpha = np.array([m.alpha for m in self.motors])
+        self._beta = np.array([m.beta for m in self.motors])
+        self._curved = {i: _invert(m._output_func()) for i, m in enumerate(self.motors) if m.curve is not None}
+        self._dirty = False
+
+    def _velocity(self) -> tuple:
+        wheels = self.wheel_speeds()
+        return wheels.mean(axis=1), (wheels[:, 1] - wheels[:, 0]) / self.wheel_base
+
+class JetRacerSim(_Simulator):
+    # Kinematic bicycle. Steering position 1.0 is max_steering_angle (rad) and throttle 1.0 is
+    # max_speed (m/s), both recovered from the servo outputs through the servo calibration.
+    def __init__(self, count:int=1, dt:float=0.02, wheel_base:float=0.17, max_steering_angle:float=0.5,
+                 max_speed:float=3.0, log_every:int=1, **robot_kwargs) -> None:
+        bus = SimBus(count)
+        robot_kwargs.setdefault('conf_store', MemoryConfigStore(JETRACER_SCHEMA))
+        name = robot_kwargs.pop('name', 'sim')
+        robots = [JetRacer(bus=bus.device(i), name=f'{name}{i}', **robot_kwargs) for i in range(count)]
+        super().__init__(robots, bus, dt, log_every)
+        self.wheel_base = wheel_base
+        self.max_steering_angle = max_steering_angle
+        self.max_speed = max_speed
+        self.servos = [s for r in robots for s in (r.servo, r.motor)]
+        for s in self.servos:
+            s.observe(self._mark_dirty, names=['alpha0', 'alpha1', 'beta', 'curve'])
+
+    def positions(self) -> np.ndarray:
+        # (N, 2) steering and throttle positions as commanded, within -1.0 to 1.0
+        if self._dirty:
+            self._refresh()
+        counts = self.bus.counts()
+        rows = np.repeat(np.arange(len(self.robots)), 2)
+        offset = counts[rows, self._channel] / 4096.0 - self._beta
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pos0 = np.where(self._alpha0 != 0, offset / self._alpha0, 0.0)
+            pos1 = np.where(self._alpha1 != 0, offset / self._alpha1, 0.0)
+        pos = np.where(pos0 > 0, pos0, np.minimum(pos1, 0.0))
+        for i, inverse in self._curved.items():
+            pos[i] = inverse(offset[i] + self._beta[i])
+        # no pulse is not count 0 through the calibration, the servo holds center and the ESC is neutral
+        pos[self.bus.full_off()[rows, self._channel]] = 0.0
+        return np.clip(pos, -1.0, 1.0).reshape(-1, 2)
+
+    def _refresh(self) -> None:
+        self._channel = np.array([s.channel for s in self.servos])
+        self._alpha0 = np.array([s.alpha0 for s in self.servos])
+        self._alpha1 = np.array([s.alpha1 for s in self.servos])
+        self._beta = np.array([s.beta for s in self.servos])
+        self._curved = {i: _invert(s._output_func()) for i, s in enumerate(self.servos) if s.curve is not None}
+        self._dirty = False
+
+    def _velocity(self) -> tuple:
+        pos = self.positions()
+        v = pos[:, 1] * self.max_speed
+        return v, v * np.tan(pos[:, 0] * self.max_steering_angle) / self.wheel_base
@@ -0,0 +1,192 @@
+import collections
+import functools
+import json
+import os
+import threading
+import time
+from typing import Callable, Union
+
+# Lightweight span tracing for the frame-to-actuation loop.
+# Spans go into a ring buffer per thread (no lock on the hot path) and can be exported as Chrome
+# trace-event JSON (chrome://tracing, Perfetto) or summarized as per-span percentiles. Disabled by
+# default; the instrumented code checks `trace.enabled` first, so the disabled cost is one attribute read.
+#
+#   from robot import trace
+#   trace.enable()
+#   ... run the loop ...
+#   trace.record('camera.age', frame.timestamp, trace.now())    # spans with a start taken elsewhere
+#   trace.export_chrome('loop.json')
+#   trace.summary()
+#
+# Times are time.monotonic_ns(), the clock of FramePool timestamps (in seconds).
+# Buffers grow with use up to buffer_size. When a new thread starts tracing, the buffers of threads that
+# have exited are folded into one shared ring of the same size, so short-lived threads (e.g. the output
+# filter's flush timers) don't pile up buffers.
+
+enabled = False
+buffer_size = 65536
+
+_buffers = []
+_buffers_lock = threading.Lock()
+# events of exited threads, with their tid and thread name
+_retired = collections.deque(maxlen=buffer_size)
+_local = threading.local()
+
+def enable(size:Union[int,None]=None) -> None:
+    # size: ring buffer entries per thread, for buffers created after this call
+    global enabled, buffer_size
+    if size is not None:
+        buffer_size = size
+    enabled = True
+
+def disable() -> None:
+    global enabled
+    enabled = False
+
+def now() -> int:
+    return time.monotonic_ns()
+
+class _Buffer:
+    __slots__ = ('thread', 'tid', 'thread_name', 'events', 'index', 'size')
+
+    def __init__(self, size:int) -> None:
+        self.thread = threading.current_thread()
+        self.tid = threading.get_native_id()
+        self.thread_name = self.thread.name
+        self.events = []
+        self.index = 0
+        self.size = size
+
+    def append(self, event:tuple) -> None:
+        if self.index < self.size:
+            self.events.append(event)
+        else:
+            self.events[self.index % self.size] = event
+        self.index += 1
+
+    def snapshot(self) -> list:
+        if self.index <= self.size:
+            return self.events[:self.index]
+        start = self.index % self.size
+        return self.events[start:] + self.events[:start]
+
+def _buffer() -> _Buffer:
+    buf = getattr(_local, 'buffer', None)
+    if buf is None:
+        buf = _local.buffer = _Buffer(buffer_size)
+        with _buffers_lock:
+            _retire()
+            _buffers.append(buf)
+    return buf
+
+def _retire() -> None:
+    # move the events of exited threads into _retired and drop their buffers; called with _buffers_lock held
+    global _retired
+    if _retired.maxlen != buffer_size:
+        _retired = collections.deque(_retired, maxlen=buffer_size)
+    live = []
+    for buf in _buffers:
+        if buf.thread.is_alive():
+            live.append(buf)
+        else:
+            _retired.extend(e + (buf.tid, buf.thread_name) for e in buf.snapshot())
+    _buffers[:] = live
+
+def record(name:str, start:Union[int,float], end:Union[int,float,None]=None, args:Union[dict,None]=None) -> None:
+    # add a finished span; start/end in monotonic ns, or in seconds as floats (FramePool timestamps)
+    if not enabled:
+        return
+    if isinstance(start, float):
+        start = int(start * 1e9)
+    if end is None:
+        end = time.monotonic_ns()
+    elif isinstance(end, float):
+        end = int(end * 1e9)
+    _buffer().append((name, start, end - start, args))
+
+class span:
+    # with trace.span('name', key=value): ...
+    __slots__ = ('name', 'args', 'start')
+
+    def __init__(self, name:str, **args) -> None:
+        self.name = name
+        self.args = args or None
+        self.start = 0
+
+    def __enter__(self) -> 'span':
+        if enabled:
+            self.start = time.monotonic_ns()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if enabled and self.start:
+            _buffer().append((self.name, self.start, time.monotonic_ns() - self.start, self.args))
+
+def traced(name:Union[str,Callable,None]=None) -> Callable:
+    # decorator, @trace.traced or @trace.traced('name'); the span name defaults to module.qualname
+    def decorate(func:Callable) -> Callable:
+        span_name = name if isinstance(name, str) else f"{func.__module__}.{func.__qualname__}"
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            start = time.monotonic_ns()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _buffer().append((span_name, start, time.monotonic_ns() - start, None))
+        return wrapper
+    if callable(name):
+        return decorate(name)
+    return decorate
+
+def events() -> list:
+    # (name, start_ns, duration_ns, args, tid, thread_name) of every buffered span, oldest first per thread
+    with _buffers_lock:
+        buffers = list(_buffers)
+        res = list(_retired)
+    for buf in buffers:
+        res += [e + (buf.tid, buf.thread_name) for e in buf.snapshot()]
+    res.sort(key=lambda e: e[1])
+    return res
+
+def clear() -> None:
+    with _buffers_lock:
+        _retired.clear()
+        for buf in _buffers:
+            buf.events = []
+            buf.index = 0
+
+def summary() -> dict:
+    # per span name: count and duration percentiles in milliseconds
+    durations = {}
+    for e in events():
+        durations.setdefault(e[0], []).append(e[2])
+    res = {}
+    for name, d in sorted(durations.items()):
+        d.sort()
+        pick = lambda q: d[min(len(d) - 1, int(len(d) * q))] / 1e6
+        res[name] = {
+            'count': len(d),
+            'mean': sum(d) / len(d) / 1e6,
+            'p50': pick(0.5),
+            'p90': pick(0.9),
+            'p99': pick(0.99),
+            'max': d[-1] / 1e6,
+        }
+    return res
+
+def export_chrome(path:str) -> None:
+    pid = os.getpid()
+    trace_events = []
+    threads = {}
+    for name, start, duration, args, tid, thread_name in events():
+        threads[tid] = thread_name
+        event = {'name': name, 'ph': 'X', 'ts': start / 1e3, 'dur': duration / 1e3, 'pid': pid, 'tid': tid}
+        if args:
+            event['args'] = args
+        trace_events.append(event)
+    for tid, thread_name in threads.items():
+        trace_events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': thread_name}})
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, f)
@@ -0,0 +1,180 @@
+import collections
+import multiprocessing
+import os
+import threading
+import time
+from typing import Union, Callable
+
+class Watchdog:
+    # Deadman switch for JetBot/JetRacer. The controller calls feed() on every command (JetBot.set_motors and
+    # JetRacer steering/throttle do it automatically once attached); if no feed arrives within `timeout`
+    # seconds the monitor writes the robot's stop registers in as few block writes as the wiring allows
+    # (one for the default channel layouts).
+    #
+    # process=False: the monitor is a thread that sleeps until the next deadline and shares the robot's bus.
+    # process=True: the monitor is a separate process with its own bus handle, so it still fires while the
+    #   controller process holds the GIL or is stopped. It needs `bus`, an adapter number or a picklable
+    #   callable returning an SMBus-like object, and uses the stop registers computed at start().
+    #
+    # Note the stop goes straight to the PCA9685, so Motor/Servo `value` traits keep the last command. The robot
+    # sees the trip count change on its next command and writes that command even if it is unchanged.
+    def __init__(self, robot, timeout:float=0.5, process:bool=False, bus:Union[int,Callable,None]=None, history:int=1000) -> None:
+        if timeout <= 0:
+            raise ValueError(f"watchdog timeout {timeout} should be positive")
+        if process and bus is None:
+            raise ValueError("process mode needs the bus (adapter number or factory) to open in the monitor process")
+        self.robot = robot
+        self.timeout = timeout
+        self.process = process
+        self.bus = bus
+        self.latencies = collections.deque(maxlen=history)
+        self._last_feed = time.monotonic()
+        self._trips = 0
+        self._running = False
+        self._wake = threading.Event()
+        self._thread = None
+        self._proc = None
+        self._shared = None
+
+    def feed(self) -> None:
+        if self._shared is not None:
+            self._shared[0] = time.monotonic()
+        else:
+            self._last_feed = time.monotonic()
+
+    def start(self) -> 'Watchdog':
+        if self._running:
+            return self
+        self._running = True
+        self.robot.watchdog = self
+        if self.process:
+            ctx = multiprocessing.get_context('spawn')
+            # [last feed, trips], written without locks: single doubles are updated atomically
+            self._shared = ctx.RawArray('d', [time.monotonic(), 0.0])
+            self._queue = ctx.Queue()
+            self._stop_flag = ctx.Event()
+            ready = ctx.Event()
+            self._proc = ctx.Process(target=_monitor_process, name='robot-watchdog', daemon=True, args=(
+                self._shared, self._stop_flag, ready, self._queue, self.timeout, self.bus,
+                self.robot.pca.address, self._smbus_blocks(), os.getpid()))
+            self._proc.start()
+            if not ready.wait(10.0):
+                self.close()
+                raise RuntimeError("watchdog process did not start")
+            self.feed()
+        else:
+            self.robot.stop_blocks()    # build the calibration tables before the first trip
+            self._last_feed = time.monotonic()
+            self._wake.clear()
+            self._thread = threading.Thread(target=self._monitor, name='robot-watchdog', daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self) -> None:
+        if not self._running:
+            return
+        self._running = False
+        if getattr(self.robot, 'watchdog', None) is self:
+            self.robot.watchdog = None
+        if self._proc is not None:
+            self._stop_flag.set()
+            self._proc.join(max(1.0, self.timeout * 2))
+            self._collect()
+            self._trips = int(self._shared[1])
+            self._proc = None
+            self._shared = None
+        else:
+            self._wake.set()
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self) -> 'Watchdog':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    @property
+    def trips(self) -> int:
+        if self._shared is not None:
+            return int(self._shared[1])
+        return self._trips
+
+    def stats(self) -> dict:
+        # detect: deadline to detection, stop: detection to stop written, total: deadline to stop written (seconds)
+        self._collect()
+        res = {'trips': self.trips, 'timeout': self.timeout, 'mode': 'process' if self.process else 'thread'}
+        for i, key in enumerate(('detect', 'stop', 'total')):
+            values = sorted(l[i] for l in self.latencies)
+            if values:
+                res[key] = {
+                    'min': values[0],
+                    'mean': sum(values) / len(values),
+                    'p99': values[min(len(values) - 1, int(len(values) * 0.99))],
+                    'max': values[-1],
+                }
+        return res
+
+    def _smbus_blocks(self) -> list:
+        # the monitor process writes with plain SMBus block writes, so split blocks at 32 bytes
+        pca = self.robot.pca
+        blocks = []
+        for reg, data in self.robot.stop_blocks():
+            for i in range(0, len(data), pca.BLOCK_BYTES):
+                blocks.append((pca._reg_offset(reg, i), data[i:i+pca.BLOCK_BYTES]))
+        return blocks
+
+    def _collect(self) -> None:
+        if self._proc is None and self._shared is None:
+            return
+        while True:
+            try:
+                self.latencies.append(self._queue.get_nowait())
+            except Exception:
+                break
+
+    def _monitor(self) -> None:
+        tripped_at = None
+        while self._running:
+            last = self._last_feed
+            deadline = last + self.timeout
+            now = time.monotonic()
+            if tripped_at is not None and last <= tripped_at:
+                # already stopped, wait for the controller to come back
+                self._wake.wait(self.timeout)
+                continue
+            if now < deadline:
+                self._wake.wait(deadline - now)
+                continue
+            tripped_at = now
+            self.robot.pca.write_blocks(self.robot.stop_blocks())
+            done = time.monotonic()
+            self._trips += 1
+            self.latencies.append((now - deadline, done - now, done - deadline))
+
+def _monitor_process(shared, stop_flag, ready, queue, timeout, bus, address, blocks, parent_pid) -> None:
+    if isinstance(bus, int):
+        from .pca9685 import SMBus
+        bus = SMBus(bus)
+    else:
+        bus = bus()
+    ready.set()
+    tripped_at = None
+    while not stop_flag.is_set():
+        last = shared[0]
+        deadline = last + timeout
+        now = time.monotonic()
+        if tripped_at is not None and last <= tripped_at:
+            if os.getppid() != parent_pid:
+                break   # controller is gone and the robot is stopped
+            stop_flag.wait(timeout)
+            continue
+        if now < deadline:
+            stop_flag.wait(deadline - now)
+            continue
+        tripped_at = now
+        for reg, data in blocks:
+            bus.write_i2c_block_data(address, reg, data)
+        done = time.monotonic()
+        shared[1] += 1
+        queue.put((now - deadline, done - now, done - deadline))
@@ -6,6 +6,16 @@ setup(
     description='',
     packages=find_packages(),
     install_requires=[
-        'smbus'
+        # smbus2 adds the raw I2C transactions (i2c_rdwr) used for 16-channel writes; plain smbus still works
+        'smbus2'
     ],
+    extras_require={
+        # robot.fleet, robot.simulator, robot.framepool
+        'sim': ['numpy'],
+        # robot.jpegcache, robot.dataset
+        'vision': ['numpy', 'opencv-python'],
+        # robot.inference; on Jetson install torch and torchvision from the JetPack wheels instead
+        'inference': ['numpy', 'torch', 'torchvision'],
+        'onnx': ['onnxruntime'],
+    },
 )
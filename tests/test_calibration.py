@@ -0,0 +1,41 @@
+from robot.calibration import CalibrationCurve, LookupTable, duty_to_count
+from robot.emulator import PCA9685Emulator
+from robot.motor import Motor, Servo
+from robot.pca9685 import PCA9685
+
+def _pca(freq):
+    pca = PCA9685(bus=PCA9685Emulator())
+    pca.frequency = freq
+    return pca
+
+def test_servo_table_matches_per_entry_build():
+    servo = Servo(_pca(50), 0)
+    for curve in (None, CalibrationCurve([(-1, 1000), (-0.2, 1380), (0, 1500), (0.5, 1700), (1, 2000)],
+                                         kind='spline', unit='us', deadband=0.05)):
+        servo.curve = curve
+        output = servo._output_func()
+        expected = LookupTable(lambda pos: duty_to_count(output(pos)), servo.table_resolution).entries
+        servo.build_table()
+        assert servo._table.entries == expected
+
+def test_motor_table_matches_per_entry_build():
+    motor = Motor(_pca(1600), 0, 1)
+    motor.alpha, motor.beta = 0.9, 0.03
+    for curve in (None, CalibrationCurve([(-1, -1), (-0.1, -0.3), (0, 0), (0.1, 0.3), (1, 1)], kind='spline', deadband=0.02)):
+        motor.curve = curve
+        output = motor._output_func()
+        def entry(speed):
+            value = output(speed)
+            return (0, duty_to_count(value)) if value > 0 else (duty_to_count(-value), 0)
+        expected = LookupTable(entry, motor.table_resolution).entries
+        motor.build_table()
+        assert motor._table.entries == expected
+
+def test_same_calibration_shares_table():
+    pca = _pca(50)
+    a, b = Servo(pca, 0), Servo(pca, 1)
+    assert a.cal_count(0.3) == b.cal_count(0.3)
+    assert a._table is b._table
+    b.beta += 0.001
+    b.cal_count(0.3)
+    assert a._table is not b._table
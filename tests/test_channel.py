@@ -0,0 +1,37 @@
+import time
+from robot.channel import ActuationDaemon, CommandChannel
+from robot.config import MemoryConfigStore, JETRACER_SCHEMA
+from robot.emulator import PCA9685Emulator
+from robot.jetracer import JetRacer
+
+def _car():
+    emu = PCA9685Emulator()
+    return emu, JetRacer(bus=emu, conf_store=MemoryConfigStore(JETRACER_SCHEMA))
+
+def test_repeated_command_after_stale_stop_is_written():
+    emu, car = _car()
+    with CommandChannel.create() as channel:
+        daemon = ActuationDaemon(car, channel, max_age=0.05)
+        channel.write(steering=0.5, throttle=0.3)
+        assert daemon.step()
+        driving = emu.duty_counts(0), emu.duty_counts(1)
+        time.sleep(0.1)
+        daemon.step()
+        assert (emu.duty_counts(0), emu.duty_counts(1)) == (car.servo.cal_count(0), car.motor.cal_count(0))
+        channel.write(steering=0.5, throttle=0.3)
+        assert daemon.step()
+        assert (emu.duty_counts(0), emu.duty_counts(1)) == driving
+        assert daemon.applied == 2
+
+def test_empty_command_is_not_applied():
+    emu, car = _car()
+    with CommandChannel.create() as channel:
+        daemon = ActuationDaemon(car, channel)
+        channel.write()
+        assert not daemon.step()
+        assert daemon.applied == 0
+
+def test_stop_writes_neutral_on_fresh_car():
+    emu, car = _car()
+    car.stop()
+    assert (emu.duty_counts(0), emu.duty_counts(1)) == (car.servo.cal_count(0), car.motor.cal_count(0))
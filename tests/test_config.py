@@ -0,0 +1,72 @@
+import json
+import os
+import time
+import pytest
+from robot import config
+from robot.config import ConfigError, ConfigStore, JETBOT_SCHEMA, JETRACER_SCHEMA
+from robot.emulator import PCA9685Emulator
+from robot.jetracer import JetRacer
+
+V1_JETRACER = {
+    'servo': {'alpha0': 0.021, 'alpha1': 0.023, 'beta': 0.075, 'min_duty': 0.05, 'max_duty': 0.1},
+    'motor': {'alpha0': 0.011, 'alpha1': 0.017, 'beta': 0.074, 'min_duty': 0.055, 'max_duty': 0.095},
+}
+JETBOT = {'left_motor': {'alpha': 1.0, 'beta': 0.0}, 'right_motor': {'alpha': -1.0, 'beta': 0.0}}
+
+def _write(path, doc):
+    with open(path, 'w') as f:
+        json.dump(doc, f)
+
+def test_v1_file_migrates_with_values_kept(tmp_path):
+    path = str(tmp_path / 'jetracer_conf.json')
+    _write(path, V1_JETRACER)
+    store = ConfigStore(path, JETRACER_SCHEMA)
+    car = JetRacer(bus=PCA9685Emulator(), conf_store=store)
+    assert car.motor.alpha0 == 0.011
+    assert car.motor.alpha1 == 0.017
+    assert car.servo.alpha1 == 0.023
+    car.save_conf(sync=True)
+    with open(path) as f:
+        doc = json.load(f)
+    assert doc['version'] == config.CONF_VERSION
+    assert doc['robots']['default']['profiles']['default'] == V1_JETRACER
+
+def test_quick_saves_are_one_write(tmp_path):
+    store = ConfigStore(str(tmp_path / 'jetbot_conf.json'), JETBOT_SCHEMA, debounce=0.1)
+    store.save(JETBOT)
+    store.save(dict(JETBOT, left_motor={'alpha': 0.9, 'beta': 0.0}))
+    assert store.writes == 0
+    time.sleep(0.3)
+    assert store.writes == 1
+    assert ConfigStore(store.path, JETBOT_SCHEMA).load()['left_motor']['alpha'] == 0.9
+
+def test_failed_write_leaves_no_partial_file(tmp_path, monkeypatch):
+    path = str(tmp_path / 'jetbot_conf.json')
+    store = ConfigStore(path, JETBOT_SCHEMA)
+    store.save(JETBOT, sync=True)
+    with open(path) as f:
+        before = f.read()
+    def fail(fd):
+        raise OSError('disk full')
+    monkeypatch.setattr(os, 'fsync', fail)
+    with pytest.raises(OSError):
+        store.save(dict(JETBOT, left_motor={'alpha': 0.5, 'beta': 0.0}), sync=True)
+    assert os.listdir(tmp_path) == ['jetbot_conf.json']
+    with open(path) as f:
+        assert f.read() == before
+
+def test_out_of_schema_values_raise(tmp_path):
+    store = ConfigStore(str(tmp_path / 'jetracer_conf.json'), JETRACER_SCHEMA)
+    bad = json.loads(json.dumps(V1_JETRACER))
+    bad['servo']['beta'] = 2.0
+    with pytest.raises(ConfigError):
+        store.save(bad)
+    bad['servo']['beta'] = float('nan')
+    with pytest.raises(ConfigError):
+        store.save(bad)
+    del bad['motor']
+    with pytest.raises(ConfigError):
+        store.save(bad)
+    _write(store.path, dict(V1_JETRACER, servo=dict(V1_JETRACER['servo'], min_duty=0.2)))
+    with pytest.raises(ConfigError):
+        store.load()
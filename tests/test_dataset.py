@@ -0,0 +1,28 @@
+import os
+import cv2
+import numpy as np
+from robot import dataset
+
+def _save(root, rel, image):
+    path = os.path.join(root, rel)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    cv2.imwrite(path, image)
+
+def test_missing_root_is_empty(tmp_path):
+    root = str(tmp_path / 'dataset_xy')
+    manifest = dataset.scan(root)
+    assert manifest['entries'] == {}
+    assert not os.path.exists(root)
+
+def test_update_matches_scan(tmp_path):
+    root = str(tmp_path)
+    image = np.random.randint(0, 255, (224, 224, 3), np.uint8)
+    _save(root, 'apex/10_20_a.jpg', image)
+    manifest = dataset.scan(root)
+    _save(root, 'apex/10_20_b.jpg', image)
+    _save(root, 'apex/300_20_c.jpg', image[::-1].copy())
+    dataset.update(root, ['apex/10_20_b.jpg', 'apex/300_20_c.jpg'], manifest)
+    statuses = {rel: e['status'] for rel, e in manifest['entries'].items()}
+    assert statuses == {rel: e['status'] for rel, e in dataset.scan(root, save=False)['entries'].items()}
+    assert statuses == {'apex/10_20_a.jpg': dataset.OK, 'apex/10_20_b.jpg': dataset.DUPLICATE,
+                        'apex/300_20_c.jpg': dataset.OUT_OF_BOUNDS}
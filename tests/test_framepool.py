@@ -0,0 +1,16 @@
+import threading
+import numpy as np
+from robot.framepool import FramePool
+
+def test_latest_before_first_frame_does_not_block():
+    pool = FramePool((8, 8, 3))
+    assert pool.latest() is None
+    assert pool.latest(0, timeout=0.01) is None
+
+def test_latest_waits_for_newer_frame():
+    pool = FramePool((8, 8, 3))
+    timer = threading.Timer(0.05, pool.write, (np.ones((8, 8, 3), np.uint8),))
+    timer.start()
+    with pool.latest(0, timeout=2.0) as frame:
+        assert frame.seq == 1
+    timer.join()
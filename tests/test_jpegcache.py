@@ -0,0 +1,23 @@
+import cv2
+import numpy as np
+from robot.framepool import FramePool
+from robot.jpegcache import JpegCache
+
+def test_annotated_copy_is_encoded_separately():
+    pool = FramePool((64, 64, 3))
+    pool.write(np.zeros((64, 64, 3), np.uint8))
+    cache = JpegCache()
+    with pool.latest() as frame, pool.copy(frame) as overlay:
+        base = cache.encode(frame)
+        cv2.circle(overlay.array, (32, 32), 10, (0, 255, 0), 3)
+        assert cache.encode(overlay) != base
+        assert cache.encode(frame) == base
+    assert (cache.hits, cache.misses) == (1, 2)
+
+def test_array_changed_in_place_is_encoded_again():
+    cache = JpegCache()
+    image = np.zeros((64, 64, 3), np.uint8)
+    base = cache.encode(image)
+    cv2.circle(image, (32, 32), 10, (0, 255, 0), 3)
+    assert cache.encode(image) != base
+    assert len(cache) == 0
@@ -0,0 +1,76 @@
+import time
+from robot.outputfilter import OutputFilter
+
+def _feed(f, values, interval):
+    written = []
+    f.sink = written.append
+    for v in values:
+        out = f(v)
+        if out is not None:
+            written.append(out)
+        time.sleep(interval)
+    time.sleep(0.1)
+    return written
+
+def test_deadband_suppresses_jitter():
+    f = OutputFilter(deadband=0.05, keepalive=None)
+    written = _feed(f, [0.3 + (0.01 if i % 2 else -0.01) for i in range(100)], 0.002)
+    assert len(written) == 1
+
+def test_rate_cap_keeps_deadband():
+    f = OutputFilter(deadband=0.05, max_rate=20, keepalive=None)
+    written = _feed(f, [0.3 + (0.01 if i % 2 else -0.01) for i in range(100)], 0.002)
+    assert len(written) == 1
+
+def test_rate_cap_flushes_last_change():
+    f = OutputFilter(deadband=0.05, max_rate=20, keepalive=None)
+    written = _feed(f, [0.3, 0.5, 0.7], 0.0)
+    assert written[0] == 0.3
+    assert written[-1] == 0.7
+    assert len(written) == 2
+
+def _settle(filt, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while filt._smoothed != filt._target and time.monotonic() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.05)
+
+def test_held_command_settles_on_servo():
+    from robot.emulator import PCA9685Emulator
+    from robot.motor import Servo
+    from robot.pca9685 import PCA9685
+    pca = PCA9685(bus=PCA9685Emulator())
+    pca.frequency = 50
+    servo = Servo(pca, 0)
+    servo.output_filter = OutputFilter(ema=0.3)
+    servo.value = 0.1
+    servo.value = 0.5
+    _settle(servo.output_filter)
+    assert pca.bus.duty_counts(0) == servo.cal_count(0.5)
+
+def test_held_command_settles_on_motor():
+    from robot.emulator import PCA9685Emulator
+    from robot.motor import Motor
+    from robot.pca9685 import PCA9685
+    pca = PCA9685(bus=PCA9685Emulator())
+    pca.frequency = 1600
+    motor = Motor(pca, 0, 1)
+    motor.output_filter = OutputFilter(ema=0.3, deadband=0.05)
+    motor.value = 0.1
+    motor.value = 0.8
+    _settle(motor.output_filter)
+    assert [pca.bus.duty_counts(c) for c in (0, 1)] == list(motor.cal_counts(0.8))
+
+def test_keepalive_rewrites_unchanged_assignment():
+    from robot.emulator import PCA9685Emulator
+    from robot.motor import Servo
+    from robot.pca9685 import PCA9685
+    pca = PCA9685(bus=PCA9685Emulator())
+    pca.frequency = 50
+    servo = Servo(pca, 0)
+    servo.output_filter = OutputFilter(keepalive=0.05)
+    servo.value = 0.3
+    time.sleep(0.1)
+    writes = pca.bus.write_count
+    servo.value = 0.3
+    assert pca.bus.write_count == writes + 1
@@ -0,0 +1,89 @@
+import threading
+import pytest
+from robot.emulator import PCA9685Emulator
+from robot.pca9685 import PCA9685
+
+def _pca():
+    emu = PCA9685Emulator()
+    pca = PCA9685(bus=emu, sync_outputs=True)
+    pca.reset()
+    pca.frequency = 50
+    return emu, pca
+
+def test_batch_writes_on_exit():
+    emu, pca = _pca()
+    with pca.batch():
+        with pca.batch():
+            pca.set_count(1, 100)
+        pca.set_count(5, 200)
+        assert emu.duty_counts(1) == 0
+    assert (emu.duty_counts(1), emu.duty_counts(5)) == (100, 200)
+
+def test_batch_discarded_on_exception():
+    emu, pca = _pca()
+    with pytest.raises(RuntimeError):
+        with pca.batch():
+            pca.set_count(1, 100)
+            raise RuntimeError
+    assert emu.duty_counts(1) == 0
+    assert pca._batching == 0
+    pca.set_count(1, 300)
+    assert emu.duty_counts(1) == 300
+
+def test_batch_counter_across_threads():
+    emu, pca = _pca()
+    def run():
+        for _ in range(2000):
+            with pca.batch():
+                pca.set_count(2, 10)
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert pca._batching == 0
+
+def _driven(robot_cls, schema, **kwargs):
+    from robot.config import MemoryConfigStore
+    emu = PCA9685Emulator(record=True, bus_speed=100000)
+    robot = robot_cls(bus=emu, sync_outputs=True, conf_store=MemoryConfigStore(schema), **kwargs)
+    assert robot.pca.mode2 & robot.pca.MODE2_OCH_MASK == 0
+    return emu, robot
+
+def test_jetracer_drive_latches_in_one_cycle():
+    from robot.config import JETRACER_SCHEMA
+    from robot.jetracer import JetRacer
+    emu, car = _driven(JetRacer, JETRACER_SCHEMA)
+    for i in range(50):
+        start = len(emu.latches)
+        car.drive(0.8 if i % 2 else -0.8, 0.5 if i % 2 else -0.5)
+        assert {channel for _, channel, _ in emu.latches[start:]} == {0, 1}
+        assert len(emu.cycles(start)) == 1
+        emu.advance(0.0037 * (i % 7))
+
+def test_jetbot_set_motors_latches_in_one_cycle():
+    from robot.config import JETBOT_SCHEMA
+    from robot.jetbot import JetBot
+    emu, bot = _driven(JetBot, JETBOT_SCHEMA, left_a=0, left_b=1, right_a=4, right_b=3)
+    # from idle only one channel of each motor changes, after this every command changes all four
+    bot.set_motors(0.6, -0.4)
+    for i in range(50):
+        start = len(emu.latches)
+        bot.set_motors(0.6 if i % 2 else -0.6, -0.4 if i % 2 else 0.4)
+        assert {channel for _, channel, _ in emu.latches[start:]} == {0, 1, 3, 4}
+        assert len(emu.cycles(start)) == 1
+        emu.advance(0.0003 * (i % 7))
+
+def test_change_on_ack_splits_commands():
+    # the control case: with OCH=1 each channel changes on its own acknowledge
+    from robot.config import JETRACER_SCHEMA
+    from robot.jetracer import JetRacer
+    emu, car = _driven(JetRacer, JETRACER_SCHEMA)
+    car.pca.configure_mode2(change_on_ack=True)
+    split = 0
+    for i in range(50):
+        start = len(emu.latches)
+        car.drive(0.8 if i % 2 else -0.8, 0.5 if i % 2 else -0.5)
+        split += len(emu.cycles(start)) > 1
+        emu.advance(0.0037 * (i % 7))
+    assert split > 0
@@ -0,0 +1,44 @@
+import os
+import numpy as np
+from robot.simulator import JetBotSim, JetRacerSim
+
+def test_idle_jetracer_stays_put():
+    sim = JetRacerSim(2)
+    assert np.array_equal(sim.positions(), np.zeros((2, 2)))
+    sim.run(1.0)
+    assert np.array_equal(sim.pose, np.zeros((2, 3)))
+
+def test_jetracer_neutral_steering_on_fresh_car():
+    sim = JetRacerSim(1)
+    car = sim.robots[0]
+    car.steering = 0.0
+    car.throttle = 0.2
+    sim.run(1.0)
+    x, y, heading = sim.pose[0]
+    assert x > 0.0
+    assert abs(y) < 1e-6 and abs(heading) < 1e-6
+
+def test_idle_jetbot_stays_put():
+    sim = JetBotSim(2)
+    assert np.array_equal(sim.wheel_speeds(), np.zeros((2, 2)))
+    sim.robots[0].set_motors(0.5, 0.5)
+    assert np.allclose(sim.wheel_speeds(), [[0.25, 0.25], [0.0, 0.0]])
+
+def test_simulator_leaves_home_alone(tmp_path, monkeypatch):
+    monkeypatch.setenv('HOME', str(tmp_path))
+    sim = JetRacerSim(2)
+    sim.robots[0].save_conf(sync=True)
+    JetBotSim(2).robots[0].save_conf(sync=True)
+    assert os.listdir(tmp_path) == []
+
+def test_simulated_robots_keep_their_own_calibration():
+    sim = JetRacerSim(2)
+    a, b = sim.robots
+    a.servo.beta = 0.08
+    a.save_conf(sync=True)
+    b.save_conf(sync=True)
+    assert [r.name for r in sim.robots] == ['sim0', 'sim1']
+    assert a.conf_store.load(a.name)['servo']['beta'] == 0.08
+    assert b.conf_store.load(b.name)['servo']['beta'] != 0.08
+    b.load_conf()
+    assert b.servo.beta != 0.08
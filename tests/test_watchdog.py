@@ -0,0 +1,34 @@
+import time
+from robot.config import MemoryConfigStore, JETBOT_SCHEMA, JETRACER_SCHEMA
+from robot.emulator import PCA9685Emulator
+from robot.jetbot import JetBot
+from robot.jetracer import JetRacer
+from robot.watchdog import Watchdog
+
+def _trip(watchdog):
+    trips = watchdog.trips
+    deadline = time.monotonic() + 2.0
+    while watchdog.trips == trips and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert watchdog.trips == trips + 1
+
+def test_jetracer_resumes_with_same_command():
+    emu = PCA9685Emulator()
+    car = JetRacer(bus=emu, conf_store=MemoryConfigStore(JETRACER_SCHEMA))
+    with Watchdog(car, timeout=0.05) as watchdog:
+        car.throttle = 0.4
+        driving = emu.duty_counts(1)
+        _trip(watchdog)
+        assert emu.duty_counts(1) == car.motor.cal_count(0)
+        car.throttle = 0.4
+        assert emu.duty_counts(1) == driving
+
+def test_jetbot_resumes_with_same_command():
+    emu = PCA9685Emulator()
+    bot = JetBot(bus=emu, left_a=0, left_b=1, right_a=4, right_b=3, conf_store=MemoryConfigStore(JETBOT_SCHEMA))
+    with Watchdog(bot, timeout=0.05) as watchdog:
+        bot.set_motors(0.5, 0.5)
+        driving = [emu.duty_counts(c) for c in range(5)]
+        _trip(watchdog)
+        bot.set_motors(0.5, 0.5)
+        assert [emu.duty_counts(c) for c in range(5)] == driving